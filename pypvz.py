@@ -1,24 +1,55 @@
+import time
+_import_start = time.perf_counter()
+import argparse
 import logging
 import traceback
 import os
-import pygame as pg
 from logging.handlers import RotatingFileHandler
 
 # 设置临时环境变量以避免Linux下禁用x11合成器
 os.environ["SDL_VIDEO_X11_NET_WM_BYPASS_COMPOSITOR"] = "0"
-# 由于在后续本地模块中存在对pygame的调用，在此处必须完成pygame的初始化
-pg.init()
 
+# 导入模块不再有初始化pygame、创建窗口或导入资源的副作用，这些步骤统一由bootstrap完成
+from source import bootstrap
 from source import tool
 from source import constants as c
+from source import pack
+from source import headless
 from source.state import mainmenu, screen, level
-
-pg.display.set_caption(c.ORIGINAL_CAPTION)  # 设置标题
-pg.mixer.set_num_channels(255)  # 设置可以同时播放的音频数量，默认为8(单位：位)，经常不够用
-if os.path.exists(c.ORIGINAL_LOGO):    # 设置窗口图标，仅对非Nuitka时生效，Nuitka不需要包括额外的图标文件，自动跳过这一过程即可
-    pg.display.set_icon(pg.image.load(c.ORIGINAL_LOGO))
+_import_time = time.perf_counter() - _import_start
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pypvz")
+    parser.add_argument("--build-gfx-cache", action="store_true",
+                        help="预先生成图片解码缓存后退出")
+    parser.add_argument("--build-atlas", action="store_true",
+                        help="将各实体的动画帧打包为图集后退出")
+    parser.add_argument("--build-pack", action="store_true",
+                        help="将图片、音效与音乐打包为单个资源包后退出（如需图集请先生成图集）")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="输出启动各阶段及各资源目录的耗时与内存统计后退出")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="关卡界面使用脏矩形渲染，只更新有变化的区域")
+    parser.add_argument("--headless", action="store_true",
+                        help="无窗口、无声音地以最快速度运行一关，输出结果与耗时后退出")
+    parser.add_argument("--mode", choices=("adventure", "littlegame"), default="adventure",
+                        help="无窗口模式运行的游戏模式")
+    parser.add_argument("--level", type=int, default=1,
+                        help="无窗口模式运行的关卡序号")
+    parser.add_argument("--max-time", type=float, default=1800,
+                        help="无窗口模式的最长游戏时间(秒)，超过后视为超时")
+    parser.add_argument("--seed", type=int,
+                        help="关卡随机数种子，相同种子与相同操作下关卡过程完全一致")
+    parser.add_argument("--turbo", type=int, default=1, choices=c.TURBO_RATES,
+                        help="关卡快进倍率，每次绘制前推进相应倍数的逻辑，游戏中也可按T键切换")
+    parser.add_argument("--record", metavar="PATH",
+                        help="将本次游戏的输入录制到文件")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="回放录制的输入文件，不读写存档")
+    parser.add_argument("--replay-max-speed", action="store_true",
+                        help="以最快速度回放，而不是按录制时的速度")
+    args = parser.parse_args()
+
     # 日志设置
     if not os.path.exists(os.path.dirname(c.USERLOG_PATH)):
         os.makedirs(os.path.dirname(c.USERLOG_PATH))
@@ -33,10 +64,57 @@ if __name__ == "__main__":
     logger.addHandler(fileHandler)
     logger.addHandler(streamHandler)
 
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    # 按顺序完成初始化
+    profiler = bootstrap.StartupProfiler()
+    profiler.addPhase("模块导入", _import_time)
+    bootstrap.bootstrap(profiler)
+    if args.dirty_rects:
+        c.DIRTY_RECT_RENDERING = True
+
+    if args.build_gfx_cache:
+        built, removed = tool.build_gfx_cache()
+        print(f"图片缓存已生成：新增{built}个，清理{removed}个，位于{c.GFX_CACHE_DIR}")
+        raise SystemExit
+    if args.build_atlas:
+        sheet_num = tool.build_atlas()
+        print(f"图集已生成：共{sheet_num}张，位于{c.PATH_ATLAS_DIR}")
+        raise SystemExit
+    if args.build_pack:
+        file_num = pack.build_pack(c.PATH_RESOURCE_PACK, c.PATH_RESOURCE_DIR)
+        print(f"资源包已生成：共{file_num}个文件，位于{c.PATH_RESOURCE_PACK}")
+        raise SystemExit
+
+    if args.headless:
+        mode = c.MODE_ADVENTURE if args.mode == "adventure" else c.MODE_LITTLEGAME
+        result = headless.run_level(mode, args.level, args.max_time * 1000, args.seed)
+        print(f"结果：{result['result']}  种子：{result['seed']}  游戏时间：{result['game_time']/1000:.1f}s  "
+              f"逻辑步数：{result['steps']}  实际耗时：{result['wall_time']:.2f}s")
+        raise SystemExit
+
+    if args.profile_startup:
+        profiler.start("读取用户数据")
+        tool.Control()
+        profiler.end()
+        print(profiler.report())
+        print()
+        print(bootstrap.profile_assets_report(tool.GFX))
+        raise SystemExit
+
     try:
         # 控制状态机运行
         game = tool.Control()
+        game.game_info[c.RANDOM_SEED] = args.seed
+        game.setTurboRate(args.turbo)
+        if args.replay:
+            game.startReplay(args.replay, args.replay_max_speed)
+        elif args.record:
+            game.startRecording(args.record)
         state_dict = {
+            c.LOAD_SCREEN: screen.LoadScreen(),
             c.MAIN_MENU: mainmenu.Menu(),
             c.GAME_VICTORY: screen.GameVictoryScreen(), 
             c.GAME_LOSE: screen.GameLoseScreen(),
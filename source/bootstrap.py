@@ -0,0 +1,130 @@
+import os
+import time
+import pygame as pg
+from . import tool
+from . import constants as c
+from . import pack
+
+# 当前进程占用的物理内存(字节)，无法获取时返回None
+def get_rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def format_size(size:int | None) -> str:
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+# 启动各阶段的耗时与内存记录
+class StartupProfiler():
+    def __init__(self):
+        self.phases = []    # (阶段名称, 耗时(秒), 内存变化(字节))
+        self.phase_name = None
+
+    def start(self, name:str):
+        self.phase_name = name
+        self.phase_time = time.perf_counter()
+        self.phase_rss = get_rss()
+
+    def end(self):
+        rss = get_rss()
+        rss_delta = None if (rss is None or self.phase_rss is None) else rss - self.phase_rss
+        self.phases.append((self.phase_name, time.perf_counter() - self.phase_time, rss_delta))
+        self.phase_name = None
+
+    def addPhase(self, name:str, duration:float, rss_delta:int | None=None):
+        self.phases.append((name, duration, rss_delta))
+
+    def report(self) -> str:
+        lines = ["启动阶段                  耗时(ms)      内存变化"]
+        for name, duration, rss_delta in self.phases:
+            lines.append(f"{name:<20}{duration*1000:>12.1f}{format_size(rss_delta):>14}")
+        total = sum(duration for _, duration, _ in self.phases)
+        lines.append(f"{'合计':<20}{total*1000:>12.1f}{format_size(get_rss()):>14}")
+        return "\n".join(lines)
+
+# 按顺序完成游戏启动前的初始化，取代原先分散在各模块导入时的副作用
+def bootstrap(profiler:StartupProfiler):
+    profiler.start("pygame初始化")
+    pg.init()
+    profiler.end()
+
+    profiler.start("创建窗口")
+    tool.SCREEN = pg.display.set_mode(c.SCREEN_SIZE)
+    pg.display.set_caption(c.ORIGINAL_CAPTION)  # 设置标题
+    if os.path.exists(c.ORIGINAL_LOGO):    # 设置窗口图标，仅对非Nuitka时生效，Nuitka不需要包括额外的图标文件，自动跳过这一过程即可
+        pg.display.set_icon(pg.image.load(c.ORIGINAL_LOGO))
+    pg.mixer.set_num_channels(255)  # 设置可以同时播放的音频数量，默认为8(单位：位)，经常不够用
+    profiler.end()
+
+    profiler.start("打开资源包")
+    pack.open_pack(c.PATH_RESOURCE_PACK, c.PATH_RESOURCE_DIR)
+    profiler.end()
+
+    profiler.start("建立图片索引")
+    tool.GFX = tool.GFXRegistry(c.PATH_IMG_DIR)
+    profiler.end()
+
+# 逐个实体文件夹统计图片的解码耗时，用于找出拖慢加载的目录
+# 返回[(目录, 文件数, 文件大小, 解码耗时, 读取缓存耗时, 像素内存)]，未生成缓存时读取缓存耗时为None
+def profile_gfx_dirs(registry:tool.GFXRegistry) -> list[tuple]:
+    rows = []
+    for entity, names in registry.entities.items():
+        file_num = file_size = pixel_size = 0
+        decode_time = cache_time = 0
+        cache_complete = True
+        for name in names:
+            path, is_frames = registry.index[name]
+            for file in tool.list_gfx_entry(name, path, is_frames, registry.accept):
+                file_num += 1
+                file_size += pack.resource_stat(file)[1]
+                start = time.perf_counter()
+                img = tool.convert_image(pack.load_surface(file), registry.colorkey)
+                decode_time += time.perf_counter() - start
+                pixel_size += img.get_width() * img.get_height() * img.get_bytesize()
+                start = time.perf_counter()
+                if tool.read_gfx_cache(file, registry.colorkey) is None:
+                    cache_complete = False
+                cache_time += time.perf_counter() - start
+        rows.append(("/".join(entity), file_num, file_size, decode_time,
+                     cache_time if cache_complete else None, pixel_size))
+    return rows
+
+# 逐个统计音效的解码耗时
+def profile_sounds() -> tuple[int, int, float]:
+    file_size = 0
+    start = time.perf_counter()
+    for sound in c.SOUNDS:
+        file_size += pack.resource_stat(sound.path)[1]
+        pack.load_sound(sound.path)
+    return len(c.SOUNDS), file_size, time.perf_counter() - start
+
+def profile_assets_report(registry:tool.GFXRegistry) -> str:
+    rows = sorted(profile_gfx_dirs(registry), key=lambda row: row[3], reverse=True)
+    lines = ["资源目录                                 文件数      大小   解码(ms)   缓存(ms)    像素内存"]
+    categories = {}
+    for path, file_num, file_size, decode_time, cache_time, pixel_size in rows:
+        cache_text = "-" if cache_time is None else f"{cache_time*1000:.1f}"
+        lines.append(f"{path:<40}{file_num:>6}{format_size(file_size):>10}{decode_time*1000:>11.1f}"
+                     f"{cache_text:>11}{format_size(pixel_size):>12}")
+        total = categories.setdefault(path.split("/")[0], [0, 0, 0, 0])
+        total[0] += file_num
+        total[1] += file_size
+        total[2] += decode_time
+        total[3] += pixel_size
+    sound_num, sound_size, sound_time = profile_sounds()
+    categories["sound"] = [sound_num, sound_size, sound_time, None]
+
+    lines.append("")
+    lines.append("资源类别                                 文件数      大小   解码(ms)                像素内存")
+    for category, (file_num, file_size, decode_time, pixel_size) in categories.items():
+        lines.append(f"{category:<40}{file_num:>6}{format_size(file_size):>10}{decode_time*1000:>11.1f}"
+                     f"{format_size(pixel_size):>23}")
+    return "\n".join(lines)
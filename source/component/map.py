@@ -187,9 +187,9 @@ class Map():
     def removeMapPlant(self, map_x:int, map_y:int, plant_name:str):
         self.map[map_y][map_x][c.MAP_PLANT].discard(plant_name)
 
-    def getRandomMapIndex(self) -> tuple[int, int]:
-        map_x = random.randint(0, self.width-1)
-        map_y = random.randint(0, self.height-1)
+    def getRandomMapIndex(self, rng:random.Random) -> tuple[int, int]:
+        map_x = rng.randint(0, self.width-1)
+        map_y = rng.randint(0, self.height-1)
         return (map_x, map_y)
 
     def checkPlantToSeed(self, x:int, y:int, plant_name:str) -> tuple[int, int]:
@@ -1,4 +1,3 @@
-import random
 import pygame as pg
 from .. import tool
 from .. import constants as c
@@ -6,10 +5,8 @@ from .. import constants as c
 
 def getSunValueImage(sun_value):
     # for pack, must include ttf
-    font = pg.font.Font(c.FONT_PATH, 14)
-    font.bold = True
     width = 35
-    msg_image = font.render(str(sun_value), True, c.NAVYBLUE, c.LIGHTYELLOW)
+    msg_image = tool.render_text(str(sun_value), 14, c.NAVYBLUE, c.LIGHTYELLOW, bold=True)
     msg_rect = msg_image.get_rect()
     msg_w = msg_rect.width
 
@@ -21,6 +18,47 @@ def getSunValueImage(sun_value):
     image.set_colorkey(c.BLACK)
     return image
 
+# 卡片图片：底图与阳光消耗只合成一次，黑底半透明的各状态图片按需生成，同种卡片共享
+class CardFace():
+    def __init__(self, name, scale, sun_cost=None):
+        frame = tool.GFX[name]
+        rect = frame.get_rect()
+        self.image = tool.get_image(frame, 0, 0, rect.w, rect.h, c.BLACK, scale)
+        self.rect = self.image.get_rect()
+        if sun_cost is not None:
+            # 绘制植物阳光消耗大小
+            sun_cost_img = tool.render_text(str(sun_cost), 12, c.BLACK)
+            sun_cost_img_rect = sun_cost_img.get_rect()
+            sun_cost_img_x = 32 - sun_cost_img_rect.w
+            self.image.blit(sun_cost_img,
+                            (sun_cost_img_x, 52, sun_cost_img_rect.w, sun_cost_img_rect.h))
+        self.shaded = {}    # 透明度 -> 黑底图片
+
+    # 黑底上按指定透明度绘制的卡片
+    def getShaded(self, alpha):
+        image = self.shaded.get(alpha)
+        if image is None:
+            image = self.shaded[alpha] = pg.Surface(self.rect.size)  # 黑底
+            self.image.set_alpha(alpha)
+            image.blit(self.image, (0, 0))
+            self.image.set_alpha(255)
+        return image
+
+    # 不透明时直接使用卡片原图
+    def getImage(self, alpha=255):
+        if alpha == 255:
+            return self.image
+        return self.getShaded(alpha)
+
+CARD_FACES = {}
+
+def getCardFace(name, scale, sun_cost=None):
+    key = (name, scale, sun_cost)
+    face = CARD_FACES.get(key)
+    if face is None:
+        face = CARD_FACES[key] = CardFace(name, scale, sun_cost)
+    return face
+
 def getCardPool(data):
     card_pool = {c.PLANT_CARD_INFO[c.PLANT_CARD_INDEX[card_name]]: data[card_name]
                     for card_name in data}
@@ -30,16 +68,10 @@ class Card():
     def __init__(self, x:int, y:int, index:int, scale:float=0.5, not_recommend=0):
         self.info = c.PLANT_CARD_INFO[index]
         self.loadFrame(self.info[c.CARD_INDEX], scale)
-        self.rect = self.orig_image.get_rect()
+        self.rect = self.face.image.get_rect()
         self.rect.x = x
         self.rect.y = y
-        # 绘制植物阳光消耗大小
-        font = pg.font.Font(c.FONT_PATH, 12)
-        self.sun_cost_img = font.render(str(self.info[c.SUN_INDEX]), True, c.BLACK)
-        self.sun_cost_img_rect = self.sun_cost_img.get_rect()
-        sun_cost_img_x = 32 - self.sun_cost_img_rect.w
-        self.orig_image.blit(self.sun_cost_img,
-                            (sun_cost_img_x, 52, self.sun_cost_img_rect.w, self.sun_cost_img_rect.h))
+        self.frozen_image = pg.Surface(self.rect.size)  # 冷却状态的图片每次重绘到这里
         
         self.index = index
         self.sun_cost = self.info[c.SUN_INDEX]
@@ -50,20 +82,13 @@ class Card():
         self.clicked = False
         self.not_recommend = not_recommend
         if self.not_recommend:
-            self.orig_image.set_alpha(128)
-            self.image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-            self.image.blit(self.orig_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+            self.image = self.face.getImage(128)
         else:
-            self.image = self.orig_image
-            self.image.set_alpha(255)
+            self.image = self.face.getImage(255)
 
     def loadFrame(self, name, scale):
-        frame = tool.GFX[name]
-        rect = frame.get_rect()
-        width, height = rect.w, rect.h
-
-        self.orig_image = tool.get_image(frame, 0, 0, width, height, c.BLACK, scale)
-        self.image = self.orig_image
+        self.face = getCardFace(name, scale, self.info[c.SUN_INDEX])
+        self.image = self.face.image
 
     def checkMouseClick(self, mouse_pos):
         x, y = mouse_pos
@@ -84,16 +109,11 @@ class Card():
         self.select = can_select
         if can_select:
             if self.not_recommend % 2:
-                self.orig_image.set_alpha(128)
-                self.image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-                self.image.blit(self.orig_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+                self.image = self.face.getImage(128)
             else:
-                self.image = self.orig_image
-                self.image.set_alpha(255)
+                self.image = self.face.getImage(255)
         else:
-            self.orig_image.set_alpha(64)
-            self.image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-            self.image.blit(self.orig_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+            self.image = self.face.getImage(64)
 
     def setFrozenTime(self, current_time):
         self.frozen_timer = current_time
@@ -102,28 +122,18 @@ class Card():
         # 有关是否满足冷却与阳光条件的图片形式
         time = current_time - self.frozen_timer
         if time < self.frozen_time: #cool down status
-            image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-            frozen_image = self.orig_image
-            frozen_image.set_alpha(128)
+            image = self.frozen_image
             frozen_height = ((self.frozen_time - time)/self.frozen_time) * self.rect.h
             
-            image.blit(frozen_image, (0,0), (0, 0, self.rect.w, frozen_height))
-            self.orig_image.set_alpha(192)
-            image.blit(self.orig_image, (0,frozen_height),
+            image.blit(self.face.getShaded(128), (0,0), (0, 0, self.rect.w, frozen_height))
+            image.blit(self.face.getShaded(192), (0,frozen_height),
                        (0, frozen_height, self.rect.w, self.rect.h - frozen_height))
         elif self.sun_cost > sun_value: #disable status
-            image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-            self.orig_image.set_alpha(192)
-            image.blit(self.orig_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+            image = self.face.getImage(192)
         elif self.clicked:
-            image = pg.Surface((self.rect.w, self.rect.h))  # 黑底
-            chosen_image = self.orig_image
-            chosen_image.set_alpha(128)
-            
-            image.blit(chosen_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+            image = self.face.getImage(128)
         else:
-            image = self.orig_image
-            image.set_alpha(255)
+            image = self.face.getImage(255)
         return image
 
     def update(self, sun_value, current_time):
@@ -143,6 +153,7 @@ class MenuBar():
         self.rect.y = 0
         
         self.sun_value = sun_value
+        self.value_image_sun = None     # 当前阳光数值图片对应的数值
         self.card_offset_x = 26
         self.setupCards(card_list)
 
@@ -216,19 +227,32 @@ class MenuBar():
                 break
 
     def drawSunValue(self):
-        self.value_image = getSunValueImage(self.sun_value)
-        self.value_rect = self.value_image.get_rect()
-        self.value_rect.x = 21
-        self.value_rect.y = self.rect.bottom - 24
+        # 阳光数值变化时才重新生成图片并绘制到植物栏上
+        if self.value_image_sun != self.sun_value:
+            self.value_image = getSunValueImage(self.sun_value)
+            self.value_image_sun = self.sun_value
+            self.value_rect = self.value_image.get_rect()
+            self.value_rect.x = 21
+            self.value_rect.y = self.rect.bottom - 24
         
-        self.image.blit(self.value_image, self.value_rect)
+            self.image.blit(self.value_image, self.value_rect)
 
-    def draw(self, surface):
+    # 植物栏底板只随阳光数值变化，返回值变化时关卡需要重新合成静态图层
+    def getBackgroundKey(self):
+        return self.sun_value
+
+    def drawBackground(self, surface):
         self.drawSunValue()
         surface.blit(self.image, self.rect)
+
+    def drawCards(self, surface):
         for card in self.card_list:
             card.draw(surface)
 
+    def draw(self, surface):
+        self.drawBackground(surface)
+        self.drawCards(surface)
+
 # 关卡模式选植物的界面
 class Panel():
     def __init__(self, card_list, sun_value, background_type=c.BACKGROUND_DAY):
@@ -312,9 +336,7 @@ class Panel():
                 for i in self.card_list:
                     if i.not_recommend == c.REASON_SLEEP_BUT_COFFEE_BEAN:
                         i.not_recommend = c.REASON_WILL_SLEEP
-                        i.orig_image.set_alpha(128)
-                        i.image = pg.Surface((i.rect.w, i.rect.h))  # 黑底
-                        i.image.blit(i.orig_image, (0,0), (0, 0, i.rect.w, i.rect.h))
+                        i.image = i.face.getImage(128)
 
         if self.selected_num >= c.CARD_MAX_NUM:
             return
@@ -329,8 +351,7 @@ class Panel():
                         for i in self.card_list:
                             if i.not_recommend == c.REASON_WILL_SLEEP:
                                 i.not_recommend = c.REASON_SLEEP_BUT_COFFEE_BEAN
-                                i.image = i.orig_image
-                                i.image.set_alpha(255)
+                                i.image = i.face.getImage(255)
                 break
 
     def addCard(self, card:Card):
@@ -375,11 +396,12 @@ class Panel():
 class MoveCard():
     def __init__(self, x, y, card_name, plant_name, scale=0.5):
         self.loadFrame(card_name, scale)
-        self.rect = self.orig_image.get_rect()
+        self.rect = self.face.image.get_rect()
         self.rect.x = x
         self.rect.y = y
         self.rect.w = 1
         self.clicked = False
+        self.area = None    # 卡片尚未完全进入传送带时只绘制左侧部分
         self.image = self.createShowImage()
 
         self.card_name = card_name
@@ -388,13 +410,9 @@ class MoveCard():
         self.select = True
 
     def loadFrame(self, name, scale):
-        frame = tool.GFX[name]
-        rect = frame.get_rect()
-        width, height = rect.w, rect.h
-
-        self.orig_image = tool.get_image(frame, 0, 0, width, height, c.BLACK, scale)
-        self.orig_rect = self.orig_image.get_rect()
-        self.image = self.orig_image
+        self.face = getCardFace(name, scale)
+        self.orig_rect = self.face.rect
+        self.image = self.face.image
 
     def checkMouseClick(self, mouse_pos):
         x, y = mouse_pos
@@ -406,22 +424,18 @@ class MoveCard():
     def createShowImage(self):
         # 新增卡片时显示图片
         if self.rect.w < self.orig_rect.w: #create a part card image
-            image = pg.Surface([self.rect.w, self.rect.h])
             if self.clicked:
-                self.orig_image.set_alpha(128)
+                image = self.face.getShaded(128)
             else:
-                self.orig_image.set_alpha(255)
-            image.blit(self.orig_image, (0, 0), (0, 0, self.rect.w, self.rect.h))
+                image = self.face.getShaded(255)
+            self.area = (0, 0, self.rect.w, self.rect.h)
             self.rect.w += 1
         else:
+            self.area = None
             if self.clicked:
-                image = pg.Surface([self.rect.w, self.rect.h])  # 黑底
-                self.orig_image.set_alpha(128)
-                
-                image.blit(self.orig_image, (0,0), (0, 0, self.rect.w, self.rect.h))
+                image = self.face.getImage(128)
             else:
-                self.orig_image.set_alpha(255)
-                image = self.orig_image
+                image = self.face.getImage(255)
         return image
 
     def update(self, left_x, current_time):
@@ -434,11 +448,12 @@ class MoveCard():
             self.move_timer += c.CARD_MOVE_TIME
 
     def draw(self, surface):
-        surface.blit(self.image, self.rect)
+        surface.blit(self.image, self.rect, self.area)
 
 # 传送带
 class MoveBar():
-    def __init__(self, card_pool):
+    def __init__(self, card_pool, rng):
+        self.rng = rng  # 关卡的随机数生成器
         self.loadFrame(c.MOVEBAR_BACKGROUND)
         self.rect = self.image.get_rect()
         self.rect.x = 20
@@ -464,7 +479,7 @@ class MoveBar():
             return False
         x = self.card_end_x
         y = 6
-        selected_card = random.choices(self.card_pool_name, self.card_pool_weight)[0]
+        selected_card = self.rng.choices(self.card_pool_name, self.card_pool_weight)[0]
         self.card_list.append(MoveCard(x, y, selected_card[c.CARD_INDEX], selected_card[c.PLANT_NAME_INDEX]))
         return True
 
@@ -497,7 +512,17 @@ class MoveBar():
     def deleateCard(self, card):
         self.card_list.remove(card)
 
-    def draw(self, surface):
+    # 传送带底板不会变化
+    def getBackgroundKey(self):
+        return None
+
+    def drawBackground(self, surface):
         surface.blit(self.image, self.rect)
+
+    def drawCards(self, surface):
         for card in self.card_list:
             card.draw(surface)
+
+    def draw(self, surface):
+        self.drawBackground(surface)
+        self.drawCards(surface)
@@ -1,4 +1,3 @@
-import random
 import pygame as pg
 from .. import tool
 from .. import constants as c
@@ -11,7 +10,7 @@ class Car(pg.sprite.Sprite):
         rect = tool.GFX[c.CAR].get_rect()
         width, height = rect.w, rect.h
         self.image = tool.get_image(tool.GFX[c.CAR], 0, 0, width, height)
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.bottom = y
@@ -48,7 +47,7 @@ class Bullet(pg.sprite.Sprite):
         self.load_images()
         self.frame_num = len(self.frames)
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = start_y
@@ -74,8 +73,7 @@ class Bullet(pg.sprite.Sprite):
             rect = frame_list[0].get_rect()
             width, height = rect.w, rect.h
 
-        for frame in frame_list:
-            frames.append(tool.get_image(frame, x, y, width, height))
+        frames.extend(tool.GFX.getFrames(name, x, y, width, height))
 
     def load_images(self):
         self.fly_frames = []
@@ -118,7 +116,7 @@ class Bullet(pg.sprite.Sprite):
         self.frames = self.explode_frames
         self.frame_num = len(self.frames)
         self.image = self.frames[0]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         # 播放子弹爆炸音效
         if self.name == c.BULLET_FIREBALL:
@@ -140,7 +138,7 @@ class Fume(pg.sprite.Sprite):
         self.load_images()
         self.frame_num = len(self.frames)
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -173,8 +171,7 @@ class Fume(pg.sprite.Sprite):
         rect = frame_list[0].get_rect()
         width, height = rect.w, rect.h
 
-        for frame in frame_list:
-            frames.append(tool.get_image(frame, x, y, width, height))
+        frames.extend(tool.GFX.getFrames(name, x, y, width, height))
 
 # 杨桃的子弹
 class StarBullet(Bullet):
@@ -232,7 +229,7 @@ class Plant(pg.sprite.Sprite):
         self.loadImages(name, scale)
         self.frame_num = len(self.frames)
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.centerx = x
         self.rect.bottom = y
@@ -259,8 +256,7 @@ class Plant(pg.sprite.Sprite):
             rect = frame_list[0].get_rect()
             width, height = rect.w, rect.h
 
-        for frame in frame_list:
-            frames.append(tool.get_image(frame, x, y, width, height, color, scale))
+        frames.extend(tool.GFX.getFrames(name, x, y, width, height, color, scale))
 
     def loadImages(self, name, scale):
         self.loadFrames(self.frames, name, scale)
@@ -274,7 +270,7 @@ class Plant(pg.sprite.Sprite):
         bottom = self.rect.bottom
         x = self.rect.x
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.bottom = bottom
         self.rect.x = x
@@ -309,13 +305,13 @@ class Plant(pg.sprite.Sprite):
             self.animate_timer = self.current_time
 
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
     def canAttack(self, zombie):
         if (zombie.name == c.SNORKELZOMBIE) and (zombie.frames == zombie.swim_frames):
@@ -325,6 +321,10 @@ class Plant(pg.sprite.Sprite):
             return True
         return False
 
+    # 可能满足canAttack的僵尸所在的横向范围，僵尸矩形与其有重叠时才需要进一步判断
+    def getAttackRange(self):
+        return self.rect.x, c.SCREEN_WIDTH - 24
+
     def setAttack(self):
         self.state = c.ATTACK
 
@@ -557,7 +557,7 @@ class CherryBomb(Plant):
         old_rect = self.rect
         image = tool.get_image(frame, 0, 0, width, height, c.BLACK, 1)
         self.image = image
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = image.get_rect()
         self.rect.centerx = old_rect.centerx
         self.rect.centery = old_rect.centery
@@ -580,14 +580,14 @@ class CherryBomb(Plant):
                 self.animate_timer = self.current_time
 
             self.image = self.frames[self.frame_index]
-            self.mask = pg.mask.from_surface(self.image)
+            self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
 
 class Chomper(Plant):
@@ -631,6 +631,9 @@ class Chomper(Plant):
             return True
         return False
 
+    def getAttackRange(self):
+        return self.rect.x, self.rect.x + c.GRID_X_SIZE*2.7
+
     def setIdle(self):
         self.state = c.IDLE
         self.changeFrames(self.idle_frames)
@@ -709,6 +712,9 @@ class PuffShroom(Plant):
             return True
         return False
 
+    def getAttackRange(self):
+        return self.rect.x, self.rect.x + c.GRID_X_SIZE * 4
+
     def setAttack(self):
         self.state = c.ATTACK
         if self.shoot_timer != 0:
@@ -808,6 +814,9 @@ class Squash(Plant):
                 return True
         return False
 
+    def getAttackRange(self):
+        return self.rect.x, self.rect.right + c.GRID_X_SIZE
+
     def setAttack(self, zombie, zombie_group):
         self.attack_zombie = zombie
         self.zombie_group = zombie_group
@@ -818,7 +827,7 @@ class Squash(Plant):
     def attacking(self):
         if self.start_boom:
             if (self.frame_index + 1) == self.frame_num:
-                for zombie in self.zombie_group:
+                for zombie in self.zombie_group.inRange(*self.getAttackRange()):
                     if self.canAttack(zombie):
                         zombie.setDamage(1800, damage_type=c.ZOMBIE_RANGE_DAMAGE)
                 self.health = 0 # 避免僵尸在原位啃食
@@ -861,6 +870,9 @@ class Spikeweed(Plant):
             return True
         return False
 
+    def getAttackRange(self):
+        return min(self.rect.centerx - 40, self.rect.x), max(self.rect.centerx + 40, self.rect.right)
+
     def setAttack(self, zombie_group):
         self.zombie_group = zombie_group
         self.animate_interval = 35
@@ -875,7 +887,7 @@ class Spikeweed(Plant):
             self.attack_timer = self.current_time
             # 最后再来判断攻击是否要杀死自己
             killSelf = False
-            for zombie in self.zombie_group:
+            for zombie in self.zombie_group.inRange(*self.getAttackRange()):
                 if self.canAttack(zombie):
                     # 有车的僵尸
                     if zombie.name in {c.ZOMBONI}:
@@ -931,14 +943,14 @@ class Jalapeno(Plant):
                     return
                 self.animate_timer = self.current_time
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
     def getPosition(self):
         return self.orig_pos
@@ -972,6 +984,10 @@ class ScaredyShroom(Plant):
             return True
         return False
 
+    # 同时包括需要害怕与可以攻击的范围
+    def getAttackRange(self):
+        return self.rect.x - self.cry_x_range, max(c.SCREEN_WIDTH - 24, self.rect.x + self.cry_x_range)
+
     def setCry(self):
         self.state = c.CRY
         self.changeFrames(self.cry_frames)
@@ -1097,14 +1113,14 @@ class IceShroom(Plant):
                         return
                 self.animate_timer = self.current_time
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
     def getPosition(self):
         return self.orig_pos
@@ -1138,16 +1154,17 @@ class HypnoShroom(Plant):
 
 
 class WallNutBowling(Plant):
-    def __init__(self, x, y, map_y, level):
+    def __init__(self, x, y, map_y, level, rng):
         Plant.__init__(self, x, y, c.WALLNUTBOWLING, 1, None)
         self.map_y = map_y
         self.level = level
+        self.rng = rng  # 关卡的随机数生成器
         self.init_rect = self.rect.copy()
         self.rotate_degree = 0
         self.animate_interval = 200
         self.move_timer = 0
         self.move_interval = 70
-        self.vel_x = random.randint(12, 15)
+        self.vel_x = self.rng.randint(12, 15)
         self.vel_y = 0
         self.disable_hit_y = -1
         self.attack_check = c.CHECK_ATTACK_NEVER
@@ -1197,7 +1214,7 @@ class WallNutBowling(Plant):
             elif self.map_y == (c.GRID_Y_LEN - 1):  # 坚果保龄球显然没有泳池的6行情形
                 self.vel_y = -self.vel_x
             else:
-                if random.randint(0, 1):
+                if self.rng.randint(0, 1):
                     self.vel_y = self.vel_x
                 else:
                     self.vel_y = -self.vel_x
@@ -1208,14 +1225,14 @@ class WallNutBowling(Plant):
 
     def animation(self):
         image = self.frames[self.frame_index]
-        self.image = pg.transform.rotate(image, self.rotate_degree)
-        self.mask = pg.mask.from_surface(self.image)
+        self.image = tool.get_rotated(image, self.rotate_degree)
+        self.mask = tool.get_mask(self.image)
         # must keep the center postion of image when rotate
         self.rect = self.image.get_rect(center=self.init_rect.center)
 
 
 class RedWallNutBowling(Plant):
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng):
         Plant.__init__(self, x, y, c.REDWALLNUTBOWLING, 1, None)
         self.orig_y = y
         self.explode_timer = 0
@@ -1226,7 +1243,7 @@ class RedWallNutBowling(Plant):
         self.animate_interval = 200
         self.move_timer = 0
         self.move_interval = 70
-        self.vel_x = random.randint(12, 15)
+        self.vel_x = rng.randint(12, 15)
         self.start_boom = False
         self.boomed = False
 
@@ -1270,10 +1287,10 @@ class RedWallNutBowling(Plant):
 
         image = self.frames[self.frame_index]
         if self.state == c.IDLE:
-            self.image = pg.transform.rotate(image, self.rotate_degree)
+            self.image = tool.get_rotated(image, self.rotate_degree)
         else:
             self.image = image
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         # must keep the center postion of image when rotate
         self.rect = self.image.get_rect(center=self.init_rect.center)
 
@@ -1400,13 +1417,13 @@ class CoffeeBean(Plant):
             self.animate_timer = self.current_time
 
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
             
 
 class SeaShroom(Plant):
@@ -1448,6 +1465,9 @@ class SeaShroom(Plant):
             return True
         return False
 
+    def getAttackRange(self):
+        return self.rect.x, self.rect.x + c.GRID_X_SIZE * 4
+
     def setAttack(self):
         self.state = c.ATTACK
         if self.shoot_timer != 0:
@@ -1508,6 +1528,9 @@ class TangleKlep(Plant):
             if pg.sprite.collide_rect_ratio(1)(zombie, self):
                 return True
         return False
+
+    def getAttackRange(self):
+        return self.rect.x, self.rect.right
     
     def setAttack(self, zombie, zombie_group):
         self.attack_zombie = zombie
@@ -1596,14 +1619,14 @@ class DoomShroom(Plant):
                         return
                     self.animate_timer = self.current_time
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
 
 # 用于描述毁灭菇的坑
@@ -1664,11 +1687,11 @@ class Hole(Plant):
 
 
 class Grave(Plant):
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng):
         Plant.__init__(self, x, y, c.GRAVE, c.INF, None)
-        self.frame_index = random.randint(0, self.frame_num - 1)
+        self.frame_index = rng.randint(0, self.frame_num - 1)
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.attack_check = c.CHECK_ATTACK_NEVER
 
     def animation(self):
@@ -1700,14 +1723,14 @@ class GraveBuster(Plant):
             self.animate_timer = self.current_time
 
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
 class FumeShroom(Plant):
     def __init__(self, x, y, bullet_group, zombie_group):
@@ -1742,6 +1765,9 @@ class FumeShroom(Plant):
             return True
         return False
 
+    def getAttackRange(self):
+        return self.rect.x, self.rect.x + c.GRID_X_SIZE * 5
+
     def setAttack(self):
         self.state = c.ATTACK
         if self.shoot_timer != 0:
@@ -1758,7 +1784,7 @@ class FumeShroom(Plant):
         if self.current_time - self.shoot_timer >= 1400:
             self.bullet_group.add(Fume(self.rect.right - 35, self.rect.y))
             # 烟雾只是个动画，实际伤害由本身完成
-            for target_zombie in self.zombie_group:
+            for target_zombie in self.zombie_group.inRange(*self.getAttackRange()):
                 if self.canAttack(target_zombie):
                     target_zombie.setDamage(c.BULLET_DAMAGE_NORMAL, damage_type=c.ZOMBIE_RANGE_DAMAGE)
             self.shoot_timer = self.current_time
@@ -1777,14 +1803,14 @@ class FumeShroom(Plant):
             self.animate_timer = self.current_time
 
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if  (self.current_time - self.highlight_time < 100):
-            self.image.set_alpha(150)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIGHLIGHT)
         elif ((self.current_time - self.hit_timer) < 200):
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
         else:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
 
 
 class IceFrozenPlot(Plant):
@@ -1854,14 +1880,14 @@ class PumpkinHead(Plant):
 
 
 class GiantWallNut(Plant):
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng):
         Plant.__init__(self, x, y, c.GIANTWALLNUT, 1, None)
         self.init_rect = self.rect.copy()
         self.rotate_degree = 0
         self.animate_interval = 200
         self.move_timer = 0
         self.move_interval = 70
-        self.vel_x = random.randint(15, 18)
+        self.vel_x = rng.randint(15, 18)
         self.attack_check = c.CHECK_ATTACK_NEVER
 
     def idling(self):
@@ -1876,7 +1902,7 @@ class GiantWallNut(Plant):
 
     def animation(self):
         image = self.frames[self.frame_index]
-        self.image = pg.transform.rotate(image, self.rotate_degree)
-        self.mask = pg.mask.from_surface(self.image)
+        self.image = tool.get_rotated(image, self.rotate_degree)
+        self.mask = tool.get_mask(self.image)
         # must keep the center postion of image when rotate
         self.rect = self.image.get_rect(center=self.init_rect.center)
@@ -1,15 +1,73 @@
+import bisect
+import operator
 import pygame as pg
-import random
 from .. import tool
 from .. import constants as c
 
+get_rect_x = operator.attrgetter("rect.x")
+
+# 一行中的僵尸，额外维护按横坐标排序的索引，用于查询某一横向范围内的僵尸
+# 生成、死亡、被魅惑与大蒜换行时随加入与移出精灵组增量维护
+# 僵尸行走(update)或更换动画帧后索引标记为过时，下次查询前重新排序
+class ZombieGroup(pg.sprite.Group):
+    def __init__(self, *sprites):
+        self.sorted_zombies = []    # 按记录时的横坐标排序的僵尸
+        self.sorted_x = []          # 与sorted_zombies对应的横坐标
+        self.max_width = 0          # 僵尸宽度的上限，用于由左端坐标推出右端坐标的范围
+        self.dirty = False          # 记录的横坐标是否可能已经过时
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer=None):
+        pg.sprite.Group.add_internal(self, sprite, layer)
+        x = sprite.rect.x
+        index = bisect.bisect_right(self.sorted_x, x)
+        self.sorted_x.insert(index, x)
+        self.sorted_zombies.insert(index, sprite)
+        self.max_width = max(self.max_width, sprite.rect.width)
+
+    def remove_internal(self, sprite):
+        pg.sprite.Group.remove_internal(self, sprite)
+        x = sprite.rect.x
+        index = bisect.bisect_left(self.sorted_x, x)
+        end = bisect.bisect_right(self.sorted_x, x, index)
+        while (index < end) and (self.sorted_zombies[index] is not sprite):
+            index += 1
+        # 记录的横坐标已经过时，只能整体查找
+        if index == end:
+            index = self.sorted_zombies.index(sprite)
+        del self.sorted_x[index]
+        del self.sorted_zombies[index]
+
+    def update(self, *args, **kwargs):
+        pg.sprite.Group.update(self, *args, **kwargs)
+        self.dirty = True
+
+    # 僵尸每次只移动少量像素，列表接近有序，排序接近线性时间
+    def resort(self):
+        self.sorted_zombies.sort(key=get_rect_x)
+        self.sorted_x = [zombie.rect.x for zombie in self.sorted_zombies]
+        self.max_width = max((zombie.rect.width for zombie in self.sorted_zombies), default=0)
+        self.dirty = False
+
+    # 矩形与横向范围[x0, x1]有重叠的僵尸，按横坐标从左到右排列
+    def inRange(self, x0, x1) -> list:
+        if not self.sorted_zombies:
+            return []
+        if self.dirty:
+            self.resort()
+        start = bisect.bisect_left(self.sorted_x, x0 - self.max_width)
+        end = bisect.bisect_right(self.sorted_x, x1)
+        return [zombie for zombie in self.sorted_zombies[start:end] if zombie.rect.right >= x0]
+
 
 class Zombie(pg.sprite.Sprite):
     def __init__(   self, x, y, name, head_group=None,
                     helmet_health=0,                helmet_type2_health=0,
                     body_health=c.NORMAL_HEALTH,    losthead_health=c.LOSTHEAD_HEALTH,
-                    damage=c.ZOMBIE_ATTACK_DAMAGE,  can_swim=False):
+                    damage=c.ZOMBIE_ATTACK_DAMAGE,  can_swim=False,
+                    rng=None):
         pg.sprite.Sprite.__init__(self)
+        self.rng = rng  # 关卡的随机数生成器，解冻时间等随机部分都来自它
 
         self.name = name
         self.frames = []
@@ -19,7 +77,7 @@ class Zombie(pg.sprite.Sprite):
 
         self.image = self.frames[self.frame_index]
         self.rect = self.image.get_rect()
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect.x = x
         self.rect.bottom = y
         # 大蒜换行移动像素值，< 0时向上，= 0时不变，> 0时向上
@@ -67,8 +125,7 @@ class Zombie(pg.sprite.Sprite):
             x, width = data["x"], data["width"]
         else:
             x = 0
-        for frame in frame_list:
-            frames.append(tool.get_image(frame, x, 0, width, height, colorkey))
+        frames.extend(tool.GFX.getFrames(name, x, 0, width, height, colorkey))
 
     def update(self, game_info):
         self.current_time = game_info[c.CURRENT_TIME]
@@ -216,6 +273,8 @@ class Zombie(pg.sprite.Sprite):
                     self.level.zombie_groups[self.map_y].remove(self)
                     self.level.zombie_groups[self.target_map_y].add(self)
                     self.to_change_group = False
+                    # 换行后本次仍会行走
+                    self.markIndexDirty()
             else:
                 self.rect.bottom = self.original_y + self.target_y_change
                 self.original_y = self.rect.bottom
@@ -229,6 +288,8 @@ class Zombie(pg.sprite.Sprite):
                     self.level.zombie_groups[self.map_y].remove(self)
                     self.level.zombie_groups[self.target_map_y].add(self)
                     self.to_change_group = False
+                    # 换行后本次仍会行走
+                    self.markIndexDirty()
             else:
                 self.rect.bottom = self.original_y + self.target_y_change
                 self.original_y = self.rect.bottom
@@ -276,7 +337,7 @@ class Zombie(pg.sprite.Sprite):
             if self.checkToDie(self.losthead_attack_frames):
                 return
 
-        if (self.current_time - self.freeze_timer) >= c.MIN_FREEZE_TIME + random.randint(0, 2000):
+        if (self.current_time - self.freeze_timer) >= c.MIN_FREEZE_TIME + self.rng.randint(0, 2000):
             self.setWalk()
             # 注意寒冰菇解冻后还有减速
             self.ice_slow_timer = self.freeze_timer + 10000 # 每次冰冻冻结 + 减速时间为20 s，而减速有10 s计时，故这里+10 s
@@ -298,14 +359,22 @@ class Zombie(pg.sprite.Sprite):
         bottom = self.rect.bottom
         centerx = self.rect.centerx
         self.image = self.frames[self.frame_index]
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = tool.get_mask(self.image)
         self.rect = self.image.get_rect()
         self.rect.bottom = bottom
         self.rect.centerx = centerx
+        # 宽度变化时左端横坐标随之改变
+        self.markIndexDirty()
+
+    # 横坐标可能在所在行的精灵组更新之外改变时，将该行的排序索引标记为过时
+    def markIndexDirty(self):
+        for group in self.groups():
+            if isinstance(group, ZombieGroup):
+                group.dirty = True
 
     def animation(self):
         if self.state == c.FREEZE:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_FROZEN)
             return
 
         if (self.current_time - self.animate_timer) > (self.animate_interval * self.getTimeRatio()):
@@ -319,12 +388,12 @@ class Zombie(pg.sprite.Sprite):
 
         self.image = self.frames[self.frame_index]
         if self.is_hypno:
-            self.image = pg.transform.flip(self.image, True, False)
-        self.mask = pg.mask.from_surface(self.image)
+            self.image = tool.get_flipped(self.image)
+        self.mask = tool.get_mask(self.image)
         if (self.current_time - self.hit_timer) >= 200:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
         else:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
 
     def getTimeRatio(self):
         return (self.ice_slow_ratio / self.speed)   # 目前的机制为：冰冻减速状态与自身速度共同决定行走的时间间隔
@@ -503,10 +572,6 @@ class Zombie(pg.sprite.Sprite):
         self.ice_trap_rect.centerx = self.rect.centerx
         self.ice_trap_rect.bottom = self.rect.bottom
 
-    def drawFreezeTrap(self, surface):
-        if self.state == c.FREEZE:
-            surface.blit(self.ice_trap_image, self.ice_trap_rect)
-
     def setHypno(self):
         self.is_hypno = True
         self.setWalk()
@@ -530,8 +595,8 @@ class ZombieHead(Zombie):
 
 
 class NormalZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.NORMAL_ZOMBIE, head_group)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.NORMAL_ZOMBIE, head_group, rng=rng)
 
     def loadImages(self):
         self.walk_frames = []
@@ -560,8 +625,8 @@ class NormalZombie(Zombie):
 
 # 路障僵尸
 class ConeHeadZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.CONEHEAD_ZOMBIE, head_group, helmet_health=c.CONEHEAD_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.CONEHEAD_ZOMBIE, head_group, helmet_health=c.CONEHEAD_HEALTH, rng=rng)
 
     def loadImages(self):
         self.helmet_walk_frames = []
@@ -596,8 +661,8 @@ class ConeHeadZombie(Zombie):
 
 
 class BucketHeadZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.BUCKETHEAD_ZOMBIE, head_group, helmet_health=c.BUCKETHEAD_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.BUCKETHEAD_ZOMBIE, head_group, helmet_health=c.BUCKETHEAD_HEALTH, rng=rng)
 
     def loadImages(self):
         self.helmet_walk_frames = []
@@ -632,8 +697,8 @@ class BucketHeadZombie(Zombie):
 
 
 class FlagZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.FLAG_ZOMBIE, head_group)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.FLAG_ZOMBIE, head_group, rng=rng)
         self.speed = 1.25
 
     def loadImages(self):
@@ -663,8 +728,8 @@ class FlagZombie(Zombie):
 
 
 class NewspaperZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.NEWSPAPER_ZOMBIE, head_group, helmet_type2_health=c.NEWSPAPER_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.NEWSPAPER_ZOMBIE, head_group, helmet_type2_health=c.NEWSPAPER_HEALTH, rng=rng)
         self.speed_up = False
 
     def loadImages(self):
@@ -727,7 +792,7 @@ class NewspaperZombie(Zombie):
 
     def animation(self):
         if self.state == c.FREEZE:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_FROZEN)
             return
 
         if (self.current_time - self.animate_timer) > (self.animate_interval * self.getTimeRatio()):
@@ -749,16 +814,16 @@ class NewspaperZombie(Zombie):
 
         self.image = self.frames[self.frame_index]
         if self.is_hypno:
-            self.image = pg.transform.flip(self.image, True, False)
-        self.mask = pg.mask.from_surface(self.image)
+            self.image = tool.get_flipped(self.image)
+        self.mask = tool.get_mask(self.image)
         if (self.current_time - self.hit_timer) >= 200:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
         else:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
 
 class FootballZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.FOOTBALL_ZOMBIE, head_group, helmet_health=c.FOOTBALL_HELMET_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.FOOTBALL_ZOMBIE, head_group, helmet_health=c.FOOTBALL_HELMET_HEALTH, rng=rng)
         self.speed = 1.88
         self.animate_interval = 50
         self.walk_animate_interval = 50
@@ -798,8 +863,8 @@ class FootballZombie(Zombie):
         self.frames = self.helmet_walk_frames
 
 class DuckyTubeZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.DUCKY_TUBE_ZOMBIE, head_group, can_swim=True)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.DUCKY_TUBE_ZOMBIE, head_group, can_swim=True, rng=rng)
 
     def loadImages(self):
         self.walk_frames = []
@@ -829,8 +894,8 @@ class DuckyTubeZombie(Zombie):
         self.frames = self.walk_frames
 
 class ConeHeadDuckyTubeZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.CONEHEAD_DUCKY_TUBE_ZOMBIE, head_group, helmet_health=c.CONEHEAD_HEALTH ,can_swim=True)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.CONEHEAD_DUCKY_TUBE_ZOMBIE, head_group, helmet_health=c.CONEHEAD_HEALTH ,can_swim=True, rng=rng)
         
     def loadImages(self):
         self.helmet_walk_frames = []
@@ -867,8 +932,8 @@ class ConeHeadDuckyTubeZombie(Zombie):
 
 
 class BucketHeadDuckyTubeZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.BUCKETHEAD_DUCKY_TUBE_ZOMBIE, head_group, helmet_health=c.BUCKETHEAD_HEALTH ,can_swim=True)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.BUCKETHEAD_DUCKY_TUBE_ZOMBIE, head_group, helmet_health=c.BUCKETHEAD_HEALTH ,can_swim=True, rng=rng)
         
     def loadImages(self):
         self.helmet_walk_frames = []
@@ -905,8 +970,8 @@ class BucketHeadDuckyTubeZombie(Zombie):
 
 
 class ScreenDoorZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.SCREEN_DOOR_ZOMBIE, head_group, helmet_type2_health=c.SCREEN_DOOR_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.SCREEN_DOOR_ZOMBIE, head_group, helmet_type2_health=c.SCREEN_DOOR_HEALTH, rng=rng)
 
     def loadImages(self):
         self.helmet_walk_frames = []
@@ -941,8 +1006,8 @@ class ScreenDoorZombie(Zombie):
 
 
 class PoleVaultingZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.POLE_VAULTING_ZOMBIE, head_group=head_group, body_health=c.POLE_VAULTING_HEALTH, losthead_health=c.POLE_VAULTING_LOSTHEAD_HEALTH)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.POLE_VAULTING_ZOMBIE, head_group=head_group, body_health=c.POLE_VAULTING_HEALTH, losthead_health=c.POLE_VAULTING_LOSTHEAD_HEALTH, rng=rng)
         self.speed = 1.88
         self.jumped = False
         self.jumping = False
@@ -989,7 +1054,7 @@ class PoleVaultingZombie(Zombie):
 
     def animation(self):
         if self.state == c.FREEZE:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_FROZEN)
             return
 
         if (self.current_time - self.animate_timer) > (self.animate_interval * self.getTimeRatio()):
@@ -1015,12 +1080,12 @@ class PoleVaultingZombie(Zombie):
 
         self.image = self.frames[self.frame_index]
         if self.is_hypno:
-            self.image = pg.transform.flip(self.image, True, False)
-        self.mask = pg.mask.from_surface(self.image)
+            self.image = tool.get_flipped(self.image)
+        self.mask = tool.get_mask(self.image)
         if (self.current_time - self.hit_timer) >= 200:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
         else:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
     
     def setWalk(self):
         self.state = c.WALK
@@ -1045,8 +1110,8 @@ class PoleVaultingZombie(Zombie):
 
 # 注意：冰车僵尸移动变速
 class Zomboni(Zombie):
-    def __init__(self, x, y, plant_group, map, IceFrozenPlot):
-        Zombie.__init__(self, x, y, c.ZOMBONI, body_health=c.ZOMBONI_HEALTH)
+    def __init__(self, x, y, plant_group, map, IceFrozenPlot, rng):
+        Zombie.__init__(self, x, y, c.ZOMBONI, body_health=c.ZOMBONI_HEALTH, rng=rng)
         self.plant_group = plant_group
         self.map = map
         self.IceFrozenPlot = IceFrozenPlot
@@ -1132,8 +1197,8 @@ class Zomboni(Zombie):
 
 
 class SnorkelZombie(Zombie):
-    def __init__(self, x, y, head_group):
-        Zombie.__init__(self, x, y, c.SNORKELZOMBIE, can_swim=True)
+    def __init__(self, x, y, head_group, rng):
+        Zombie.__init__(self, x, y, c.SNORKELZOMBIE, can_swim=True, rng=rng)
         self.speed = 1.6
         self.walk_animate_interval = 50
         self.canSetAttack = True
@@ -1218,7 +1283,7 @@ class SnorkelZombie(Zombie):
 
     def animation(self):
         if self.state == c.FREEZE:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_FROZEN)
             return
 
         if (self.current_time - self.animate_timer) > (self.animate_interval * self.getTimeRatio()):
@@ -1242,13 +1307,13 @@ class SnorkelZombie(Zombie):
 
         self.image = self.frames[self.frame_index]
         if self.is_hypno:
-            self.image = pg.transform.flip(self.image, True, False)
-        self.mask = pg.mask.from_surface(self.image)
+            self.image = tool.get_flipped(self.image)
+        self.mask = tool.get_mask(self.image)
 
         if (self.current_time - self.hit_timer) >= 200:
-            self.image.set_alpha(255)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_NORMAL)
         else:
-            self.image.set_alpha(192)
+            self.image = tool.get_effect_image(self.image, c.EFFECT_HIT)
 
     # 注意潜水僵尸较为特殊：这里的setAttack并没有直接触发攻击状态，而是触发从水面浮起
     def setAttack(self, prey, is_plant=True):
@@ -1,22 +1,49 @@
 import os
 import pygame as pg
+from . import sound
 
 # 用户数据及日志存储路径
 if os.name == "nt":  # Windows系统存储路径  
     USERLOG_PATH = os.path.expandvars(os.path.join("%APPDATA%", "pypvz", "run.log"))  
     DB_PATH = os.path.expandvars(os.path.join("%APPDATA%", "pypvz", "userdata.db"))  
+    GFX_CACHE_DIR = os.path.expandvars(os.path.join("%APPDATA%", "pypvz", "gfxcache"))
 else:  # 非Windows系统存储路径  
     USERLOG_PATH = os.path.expanduser(os.path.join("~", ".config", "pypvz", "run.log"))  
     DB_PATH = os.path.expanduser(os.path.join("~", ".config", "pypvz", "userdata.db"))  
+    GFX_CACHE_DIR = os.path.expanduser(os.path.join("~", ".config", "pypvz", "gfxcache"))
 
 # 游戏图片资源路径
 PATH_IMG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "graphics")
+# 图集文件夹路径，由 pypvz.py --build-atlas 生成
+PATH_ATLAS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "atlas")
+# 图集索引格式版本与单张图集的最大边长
+ATLAS_VERSION = 1
+ATLAS_MAX_SIZE = 2048
+# 图片解码缓存版本，缓存格式变化时需要增加，旧版本缓存会自动失效
+GFX_CACHE_VERSION = 2
+# 批量导入图片时并行解码的线程数，为1时按顺序逐个解码
+GFX_LOAD_WORKERS = min(8, os.cpu_count() or 1)
+# 单文件资源包路径，由 pypvz.py --build-pack 生成，存在时优先从中读取资源
+PATH_RESOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+PATH_RESOURCE_PACK = os.path.join(PATH_RESOURCE_DIR, "pypvz.pack")
 # 游戏音乐文件夹路径
 PATH_MUSIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources","music")
 # 窗口图标
 ORIGINAL_LOGO = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pypvz-exec-logo.png")
 # 字体路径
 FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources", "DroidSansFallback.ttf")
+# 关卡界面使用脏矩形渲染，只重绘并更新有内容变化的区域，可由 pypvz.py --dirty-rects 开启
+DIRTY_RECT_RENDERING = False
+# 固定时间步长：关卡逻辑每次推进的游戏时间(毫秒)，与原先120帧时每帧推进的时间相同
+SIMULATION_TICK = 1000 / 120
+# 固定时间步长时绘制帧率的上限
+RENDER_FPS = 60
+# 每次绘制前最多推进的逻辑次数，超过时丢弃积压的时间，游戏整体变慢而不是改变逻辑行为
+MAX_SIMULATION_STEPS = 8
+# 快进倍率，关卡中按T键依次切换；快进时每次绘制前推进相应倍数的逻辑，逻辑行为与1倍速完全一致
+TURBO_RATES = (1, 2, 4, 8, 16)
+# 渲染文字缓存保留的最大条数
+TEXT_CACHE_SIZE = 128
 
 # 窗口标题
 ORIGINAL_CAPTION = "pypvz"
@@ -103,10 +130,13 @@ LEVEL_COMPLETIONS = "level completions"
 LITTLEGAME_COMPLETIONS = "littleGame completions"
 GAME_RATE = "game rate"
 SOUND_VOLUME = "volume"
+RANDOM_SEED = "random seed"     # 关卡随机数种子，也可以写在关卡数据中；不保存到存档
 
 # 整个游戏的状态
 MAIN_MENU = "main menu"
 LOAD_SCREEN = "load screen"
+# 加载界面每帧用于转换图片的最长时间(毫秒)，其余时间留给绘制与事件响应
+LOAD_SCREEN_PUMP_TIME = 10
 GAME_LOSE = "game lose"
 GAME_VICTORY = "game victory"
 LEVEL = "level"
@@ -602,6 +632,18 @@ CRY = "cry"
 FREEZE = "freeze"
 SLEEP = "sleep"
 
+# 图片显示效果及对应的整体透明度
+EFFECT_NORMAL = "normal"
+EFFECT_HIGHLIGHT = "highlight"  # 被铲子选中
+EFFECT_HIT = "hit"              # 受到攻击
+EFFECT_FROZEN = "frozen"        # 被冰冻
+EFFECT_ALPHA = {
+                EFFECT_NORMAL:      255,
+                EFFECT_HIGHLIGHT:   150,
+                EFFECT_HIT:         192,
+                EFFECT_FROZEN:      192,
+}
+
 # 关卡状态
 CHOOSE = "choose"
 PLAY = "play"
@@ -655,8 +697,9 @@ for _part1 in (DUCKY_TUBE_ZOMBIE, CONEHEAD_DUCKY_TUBE_ZOMBIE, BUCKETHEAD_DUCKY_T
 
 
 # 音效
+# 音效在第一次播放时才解码，见sound.LazySound
 def _getSound(filename):
-    return pg.mixer.Sound(os.path.join(os.path.dirname(os.path.dirname(__file__)) ,"resources", "sound", filename))
+    return sound.LazySound(os.path.join(PATH_RESOURCE_DIR, "sound", filename))
 # 所有音效的元组，用一波海象算子表达，免得要维护两个
 SOUNDS = (  # 程序交互等
             SOUND_TAPPING_CARD              := _getSound("tap.ogg"),
@@ -0,0 +1,49 @@
+import time
+from . import constants as c
+from .state import level
+
+# 无窗口模式：不绘制、不受实际时钟限制地运行一关，用于平衡性与回归测试
+# 调用前需要以SDL的dummy视频与音频驱动完成bootstrap；不连接存档数据库，关卡结果不会保存
+HEADLESS_RESULTS = {
+                    c.GAME_VICTORY: "victory",
+                    c.AWARD_SCREEN: "victory",
+                    c.GAME_LOSE:    "lose",
+}
+
+# 以虚拟时钟逐步推进关卡逻辑直到关卡结束或超过最长游戏时间(毫秒)
+# 种子为None时使用关卡数据中的种子或随机生成，实际使用的种子随结果返回
+def run_level(mode:str, level_num:int, max_game_time:float, seed:int=None) -> dict:
+    game_info = c.INIT_USERDATA.copy()
+    game_info[c.GAME_MODE] = mode
+    game_info[c.RANDOM_SEED] = seed
+    if mode == c.MODE_ADVENTURE:
+        game_info[c.LEVEL_NUM] = level_num
+    else:
+        game_info[c.LITTLEGAME_NUM] = level_num
+
+    start = time.perf_counter()
+    current_time = 0
+    state = level.Level()
+    state.startup(current_time, game_info)
+    if state.state == c.CHOOSE:
+        # 没有玩家选卡，按选卡界面的顺序带入前几种植物
+        state.initPlay(list(c.CARDS_TO_CHOOSE)[:c.CARD_LIST_NUM])
+
+    steps = 0
+    while (not state.done) and (current_time < max_game_time):
+        current_time += c.SIMULATION_TICK
+        state.step(current_time, None, [False, False])
+        steps += 1
+
+    if state.done:
+        result = HEADLESS_RESULTS.get(state.next, state.next)
+    else:
+        result = "timeout"
+    state.cleanup()
+    return {
+            "result":       result,
+            "seed":         state.seed,
+            "game_time":    current_time,
+            "steps":        steps,
+            "wall_time":    time.perf_counter() - start,
+    }
@@ -0,0 +1,230 @@
+import io
+import os
+import json
+import mmap
+import struct
+import logging
+import pygame as pg
+logger = logging.getLogger("main")
+
+# 单文件资源包：把图片、音效与音乐全部写入一个带索引的文件
+# 运行时内存映射整个资源包，各资源以切片的形式交给pg.image.load与pg.mixer.Sound读取，
+# 目录结构也记录在索引中，遍历资源目录时不再访问文件系统
+PACK_MAGIC = b"PVZP"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct("<4sIQ")    # 标识, 版本, 索引长度
+PACK_SUBDIRS = ("graphics", "atlas", "sound", "music")
+
+# 资源包内单个文件的只读文件对象，直接读取内存映射中的切片
+class PackFile(io.RawIOBase):
+    def __init__(self, data:memoryview, name:str):
+        self.data = data
+        self.name = name
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), len(self.data) - self.pos)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+    def seek(self, offset:int, whence:int=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = len(self.data) + offset
+        self.pos = max(self.pos, 0)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+class ResourcePack():
+    def __init__(self, pack_path:str, root:str):
+        self.root = root
+        self.file = open(pack_path, "rb")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_size = PACK_HEADER.unpack_from(self.mm)
+            if (magic != PACK_MAGIC) or (version != PACK_VERSION):
+                raise ValueError("资源包版本与游戏不符")
+            index = json.loads(self.mm[PACK_HEADER.size:PACK_HEADER.size + index_size])
+        except (OSError, ValueError, struct.error):
+            self.file.close()
+            raise
+        self.data = memoryview(self.mm)[PACK_HEADER.size + index_size:]
+        self.files = index["files"]     # 相对路径 -> [偏移, 大小, 源文件修改时间]
+        self.dirs = index["dirs"]       # 相对路径 -> 目录内容，顺序与打包时的os.listdir相同
+        self.checked = {}               # 相对路径 -> 包内内容是否与源文件一致，每个文件只检查一次
+
+    # 源文件在打包后被修改时包内内容已过期，改为直接读取源文件
+    # 源文件不存在（只发布资源包）时以包内内容为准
+    def isFresh(self, key:str) -> bool:
+        fresh = self.checked.get(key)
+        if fresh is None:
+            _, size, mtime_ns = self.files[key]
+            try:
+                stat = os.stat(os.path.join(self.root, key))
+                fresh = (stat.st_size == size) and (stat.st_mtime_ns == mtime_ns)
+            except FileNotFoundError:
+                fresh = True
+            if not fresh:
+                logger.warning(f"资源包中的{key}与源文件不一致，改为直接读取源文件，请重新打包")
+            self.checked[key] = fresh
+        return fresh
+
+    def entry(self, path:str) -> list | None:
+        key = self.key(path)
+        if (key not in self.files) or (not self.isFresh(key)):
+            return None
+        return self.files[key]
+
+    # 资源包内统一使用相对于资源根目录、以"/"分隔的路径
+    def key(self, path:str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def open(self, path:str) -> PackFile | None:
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        offset, size, _ = entry
+        return PackFile(self.data[offset:offset + size], os.path.basename(path))
+
+    def stat(self, path:str) -> tuple[int, int] | None:
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        _, size, mtime_ns = entry
+        return mtime_ns, size
+
+    def listdir(self, path:str) -> list[str] | None:
+        return self.dirs.get(self.key(path))
+
+    def isdir(self, path:str) -> bool | None:
+        key = self.key(path)
+        if key in self.dirs:
+            return True
+        if key in self.files:
+            return False
+        return None
+
+    def close(self):
+        self.data.release()
+        self.mm.close()
+        self.file.close()
+
+current = None  # 当前使用的资源包，不存在时为None，此时所有资源直接从文件读取
+
+def open_pack(pack_path:str, root:str):
+    global current
+    close_pack()
+    if not os.path.exists(pack_path):
+        return
+    try:
+        current = ResourcePack(pack_path, root)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.warning(f"资源包读取失败，改为直接读取资源文件: {e}")
+
+def close_pack():
+    global current
+    if current is not None:
+        current.close()
+        current = None
+
+# 以下函数在资源包中存在对应资源时从资源包读取，否则访问文件系统
+def open_resource(path:str) -> PackFile | str:
+    if current is not None:
+        f = current.open(path)
+        if f is not None:
+            return f
+    return path
+
+def read_bytes(path:str) -> bytes:
+    f = open_resource(path)
+    if isinstance(f, PackFile):
+        return f.read()
+    with open(f, "rb") as f:
+        return f.read()
+
+# 返回(修改时间, 大小)
+def resource_stat(path:str) -> tuple[int, int]:
+    if current is not None:
+        stat = current.stat(path)
+        if stat is not None:
+            return stat
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def listdir(path:str) -> list[str]:
+    if current is not None:
+        names = current.listdir(path)
+        if names is not None:
+            return names
+    return os.listdir(path)
+
+def isdir(path:str) -> bool:
+    if current is not None:
+        result = current.isdir(path)
+        if result is not None:
+            return result
+    return os.path.isdir(path)
+
+def load_surface(path:str) -> pg.Surface:
+    f = open_resource(path)
+    if isinstance(f, PackFile):
+        return pg.image.load(f, f.name)
+    return pg.image.load(f)
+
+def load_sound(path:str) -> pg.mixer.Sound:
+    return pg.mixer.Sound(open_resource(path))
+
+def load_music(path:str):
+    f = open_resource(path)
+    if isinstance(f, PackFile):
+        pg.mixer.music.load(f, os.path.splitext(f.name)[1][1:])
+    else:
+        pg.mixer.music.load(f)
+
+# 把资源根目录下的指定子目录打包为单个文件，返回打包的文件数量
+def build_pack(pack_path:str, root:str, subdirs:tuple[str]=PACK_SUBDIRS) -> int:
+    files = {}
+    dirs = {}
+    paths = []
+    offset = 0
+    for subdir in subdirs:
+        top = os.path.join(root, subdir)
+        if not os.path.isdir(top):
+            continue
+        for dirpath, _, _ in os.walk(top):
+            key = os.path.relpath(dirpath, root).replace(os.sep, "/")
+            dirs[key] = os.listdir(dirpath)
+            for name in dirs[key]:
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    files[f"{key}/{name}"] = [offset, stat.st_size, stat.st_mtime_ns]
+                    paths.append(path)
+                    offset += stat.st_size
+
+    index = json.dumps({"files": files, "dirs": dirs}, ensure_ascii=False).encode("utf-8")
+    # 正在使用的资源包可能被内存映射，先写入临时文件再替换
+    tmp_path = f"{pack_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(index)))
+        f.write(index)
+        for path in paths:
+            with open(path, "rb") as src:
+                f.write(src.read())
+    close_pack()
+    os.replace(tmp_path, pack_path)
+    return len(paths)
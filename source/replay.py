@@ -0,0 +1,100 @@
+import json
+import struct
+import pygame as pg
+from . import constants as c
+
+# 输入录制与回放
+# 每帧记录状态机实际使用的计时、鼠标位置、点击与按键，回放时按同样的路径交给状态机，
+# 配合关卡随机数种子即可完全复现一局游戏
+REPLAY_MAGIC = b"PVZR"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sII")  # 标识, 版本, 附加信息长度
+REPLAY_FRAME = struct.Struct("<IhhBB")  # 计时(毫秒), 鼠标x, 鼠标y, 标志, 按键数量
+REPLAY_CLICK = struct.Struct("<hh")     # 点击位置
+REPLAY_KEY = struct.Struct("<i")        # 按键
+
+FLAG_CLICK = 1
+FLAG_LEFT = 2
+FLAG_RIGHT = 4
+FLAG_QUIT = 8
+
+# 附加信息中录制开始时的快进倍率，不属于用户数据，单独保存
+REPLAY_TURBO_RATE = "turbo rate"
+
+# 回放开始前需要还原的用户数据
+REPLAY_GAME_INFO_KEYS = (
+                        c.LEVEL_NUM, c.LITTLEGAME_NUM,
+                        c.LEVEL_COMPLETIONS, c.LITTLEGAME_COMPLETIONS,
+                        c.GAME_RATE, c.SOUND_VOLUME, c.RANDOM_SEED,
+)
+
+class InputRecorder():
+    def __init__(self, path:str, game_info:dict, turbo_rate:int=1):
+        self.file = open(path, "wb")
+        info = {key: game_info.get(key) for key in REPLAY_GAME_INFO_KEYS}
+        info[REPLAY_TURBO_RATE] = turbo_rate
+        info = json.dumps(info).encode("utf-8")
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, len(info)))
+        self.file.write(info)
+
+    def recordFrame(self, ticks:int, cursor_pos:tuple[int, int], click:tuple | None, keys:list[int], quit:bool):
+        flags = 0
+        if click is not None:
+            flags |= FLAG_CLICK
+            if click[1]:
+                flags |= FLAG_LEFT
+            if click[2]:
+                flags |= FLAG_RIGHT
+        if quit:
+            flags |= FLAG_QUIT
+        data = [REPLAY_FRAME.pack(ticks, *cursor_pos, flags, len(keys))]
+        if click is not None:
+            data.append(REPLAY_CLICK.pack(*click[0]))
+        data.extend(REPLAY_KEY.pack(key) for key in keys)
+        self.file.write(b"".join(data))
+        # 每帧写入磁盘，游戏崩溃时记录仍然完整
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class InputReplayer():
+    def __init__(self, path:str, max_speed:bool=False):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, info_size = REPLAY_HEADER.unpack_from(data)
+        if (magic != REPLAY_MAGIC) or (version != REPLAY_VERSION):
+            raise ValueError("输入记录版本与游戏不符")
+        self.game_info = json.loads(data[REPLAY_HEADER.size:REPLAY_HEADER.size + info_size])
+        self.turbo_rate = self.game_info.pop(REPLAY_TURBO_RATE, 1)
+        self.data = data
+        self.offset = REPLAY_HEADER.size + info_size
+        self.max_speed = max_speed
+        self.start_ticks = None     # 回放开始时的实际时刻与记录中的第一个计时
+        self.first_ticks = None
+
+    # 读取下一帧，返回(计时, 鼠标位置, 点击, 按键, 是否退出)，记录结束时返回None
+    def nextFrame(self) -> tuple | None:
+        if self.offset + REPLAY_FRAME.size > len(self.data):
+            return None
+        ticks, x, y, flags, key_num = REPLAY_FRAME.unpack_from(self.data, self.offset)
+        self.offset += REPLAY_FRAME.size
+        click = None
+        if flags & FLAG_CLICK:
+            click = (REPLAY_CLICK.unpack_from(self.data, self.offset),
+                     bool(flags & FLAG_LEFT), bool(flags & FLAG_RIGHT))
+            self.offset += REPLAY_CLICK.size
+        keys = []
+        for _ in range(key_num):
+            keys.append(REPLAY_KEY.unpack_from(self.data, self.offset)[0])
+            self.offset += REPLAY_KEY.size
+
+        # 按原速回放时等待到记录中的时刻
+        if not self.max_speed:
+            if self.start_ticks is None:
+                self.start_ticks = pg.time.get_ticks()
+                self.first_ticks = ticks
+            delay = (ticks - self.first_ticks) - (pg.time.get_ticks() - self.start_ticks)
+            if delay > 0:
+                pg.time.wait(delay)
+        return ticks, (x, y), click, keys, bool(flags & FLAG_QUIT)
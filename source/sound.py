@@ -0,0 +1,46 @@
+import pygame as pg
+from . import pack
+
+# 延迟解码的音效，接口与pg.mixer.Sound相同
+# 创建时只记录路径，第一次播放(或warmup)时才解码，解码前设置的音量在解码后生效
+class LazySound():
+    def __init__(self, path:str):
+        self.path = path
+        self.sound = None
+        self.volume = None
+
+    def load(self) -> pg.mixer.Sound:
+        if self.sound is None:
+            self.sound = pack.load_sound(self.path)
+            if self.volume is not None:
+                self.sound.set_volume(self.volume)
+        return self.sound
+
+    def isLoaded(self) -> bool:
+        return self.sound is not None
+
+    def play(self, *args, **kwargs) -> pg.mixer.Channel:
+        return self.load().play(*args, **kwargs)
+
+    def set_volume(self, value:float):
+        self.volume = value
+        if self.sound is not None:
+            self.sound.set_volume(value)
+
+    def get_volume(self) -> float:
+        if self.sound is None:
+            return 1.0 if self.volume is None else self.volume
+        return self.sound.get_volume()
+
+    def stop(self):
+        if self.sound is not None:
+            self.sound.stop()
+
+    # 其余接口直接交给解码后的pg.mixer.Sound
+    def __getattr__(self, name:str):
+        return getattr(self.load(), name)
+
+# 预先解码一组音效，避免第一次播放时卡顿
+def warmup(sounds):
+    for sound in sounds:
+        sound.load()
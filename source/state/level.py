@@ -4,12 +4,22 @@ import random
 import logging
 from .. import tool
 from .. import constants as c
+from .. import pack
 from ..component import map, plant, zombie, menubar
 logger = logging.getLogger("main")
 
+# 关卡界面本身用到的图片：铲子、菜单、植物栏、进度条、小推车等
+LEVEL_UI_GFX = (c.SHOVEL, c.SHOVEL_BOX, c.LITTLE_MENU, c.BIG_MENU,
+                c.RESTART_BUTTON, c.MAINMENU_BUTTON, c.SOUND_VOLUME_BUTTON,
+                c.MENUBAR_BACKGROUND, c.MOVEBAR_BACKGROUND, c.PANEL_BACKGROUND, c.START_BUTTON,
+                c.HUGE_WAVE_APPROCHING, c.LEVEL_PROGRESS_BAR, c.LEVEL_PROGRESS_ZOMBIE_HEAD,
+                c.LEVEL_PROGRESS_FLAG, c.CAR, c.BOOM_IMAGE)
+
 class Level(tool.State):
     def __init__(self):
         tool.State.__init__(self)
+        self.gfx_manifest = set()   # 本关已预先导入的图片名称
+        self.fixed_timestep = True
 
     def startup(self, current_time, persist):
         # 获取上下文和时间
@@ -26,6 +36,7 @@ class Level(tool.State):
 
         # 导入地图参数
         self.loadMap()
+        self.setupRandom()
         self.map = map.Map(self.map_data[c.BACKGROUND_TYPE])
         self.map_x_len = self.map.width
         self.map_y_len = self.map.height
@@ -80,15 +91,99 @@ class Level(tool.State):
             elif self.map_data[c.BACKGROUND_TYPE] == c.BACKGROUND_FOG:
                 self.bgm = "fogLevel.opus"
 
+    # 按游戏进度取得的关卡数据，不改变当前关卡，关卡序号无效时为None
+    def getMapData(self, game_info:dict) -> dict | None:
+        if game_info[c.GAME_MODE] == c.MODE_ADVENTURE:
+            if 0 <= game_info[c.LEVEL_NUM] < map.TOTAL_LEVEL:
+                return map.LEVEL_MAP_DATA[game_info[c.LEVEL_NUM]]
+        elif game_info[c.GAME_MODE] == c.MODE_LITTLEGAME:
+            if 0 <= game_info[c.LITTLEGAME_NUM] < map.TOTAL_LITTLE_GAME:
+                return map.LITTLE_GAME_MAP_DATA[game_info[c.LITTLEGAME_NUM]]
+        return None
+
+    # 关卡开始前(选卡或传送带)可能带入的植物
+    def getPlantPool(self, map_data:dict):
+        if c.CHOOSEBAR_TYPE in map_data:
+            return map_data[c.CARD_POOL]
+        return (c.PLANT_CARD_INFO[index][c.PLANT_NAME_INDEX] for index in c.CARDS_TO_CHOOSE)
+
+    # 本关可能用到的图片名称：可用植物与出场僵尸所在实体文件夹的全部动画、植物卡片、
+    # 关卡界面，以及子弹、阳光等公用素材
+    def getGfxManifest(self, plant_names, map_data:dict) -> set[str]:
+        zombie_names = {c.NORMAL_ZOMBIE, c.FLAG_ZOMBIE}
+        if c.INCLUDED_ZOMBIES in map_data:
+            zombie_names.update(map_data[c.INCLUDED_ZOMBIES])
+        if c.INEVITABLE_ZOMBIE_DICT in map_data:
+            for wave_zombies in map_data[c.INEVITABLE_ZOMBIE_DICT].values():
+                zombie_names.update(wave_zombies)
+        if c.ZOMBIE_LIST in map_data:
+            zombie_names.update(data["name"] for data in map_data[c.ZOMBIE_LIST])
+        # 带防具的水上僵尸失去防具后使用鸭子救生圈僵尸的素材
+        if zombie_names & c.WATER_ZOMBIE:
+            zombie_names.add(c.DUCKY_TUBE_ZOMBIE)
+
+        plant_names = tuple(plant_names)
+        manifest = {c.BACKGROUND_NAME, *LEVEL_UI_GFX}
+        for name in (*zombie_names, *plant_names, c.SUN, c.GRAVE, c.HOLE, c.ICEFROZENPLOT):
+            manifest.update(tool.GFX.entityNames(name))
+        manifest.update(c.PLANT_CARD_INFO[c.PLANT_CARD_INDEX[name]][c.CARD_INDEX]
+                        for name in plant_names if name in c.PLANT_CARD_INDEX)
+        manifest.update(tool.GFX.categoryNames("Bullets"))
+        return manifest
+
+    # 进入关卡前由加载界面导入的图片
+    def getPreloadGfx(self, persist):
+        self.game_info = persist
+        self.loadMap()
+        return self.getGfxManifest(self.getPlantPool(self.map_data), self.map_data)
+
+    # 关卡中频繁出现的音效
+    def getWarmupSounds(self, persist):
+        return (c.SOUND_SHOOT, c.SOUND_BULLET_EXPLODE, c.SOUND_PLANT, c.SOUND_COLLECT_SUN,
+                c.SOUND_CLICK_CARD, c.SOUND_TAPPING_CARD, c.SOUND_ZOMBIE_ATTACKING,
+                c.SOUND_ZOMBIE_COMING, c.SOUND_BUTTON_CLICK)
+
+    # 预先导入本关所需的图片，并释放上一份清单中不再需要的部分
+    def loadGfxManifest(self, plant_names):
+        manifest = self.getGfxManifest(plant_names, self.map_data)
+        tool.GFX.evict(self.gfx_manifest - manifest)
+        tool.GFX.preload(manifest)
+        self.gfx_manifest = manifest
+
+    # 关卡结束时释放本关导入的图片，按当前进度接下来进入的关卡仍会用到的部分保留，避免加载界面重新解码
+    def cleanup(self):
+        map_data = self.getMapData(self.game_info)
+        if map_data is None:
+            keep = set()
+        else:
+            keep = self.getGfxManifest(self.getPlantPool(map_data), map_data)
+        tool.GFX.evict(self.gfx_manifest - keep)
+        self.gfx_manifest &= keep
+        return tool.State.cleanup(self)
+
+    # 关卡内所有随机数都来自这一生成器，种子相同且操作相同时整局游戏完全一致
+    # 种子优先取自命令行(game_info)，其次取自关卡数据，都没有时随机生成并记录下来以便复现
+    def setupRandom(self):
+        seed = self.game_info.get(c.RANDOM_SEED)
+        if seed is None:
+            seed = self.map_data.get(c.RANDOM_SEED)
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.random = random.Random(seed)
+
     def setupBackground(self):
         img_index = self.map_data[c.BACKGROUND_TYPE]
         self.background_type = img_index
         self.background = tool.GFX[c.BACKGROUND_NAME][img_index]
         self.bg_rect = self.background.get_rect()
 
-        self.level = pg.Surface((self.bg_rect.w, self.bg_rect.h)).convert()
         self.viewport = tool.SCREEN.get_rect(bottom=self.bg_rect.bottom)
         self.viewport.x += c.BACKGROUND_OFFSET_X
+        # 背景、铲子槽、菜单按钮与植物栏底板只在事件发生时变化，合成为一张静态图层，每帧只需绘制一次
+        self.static_layer = pg.Surface(self.viewport.size).convert()
+        self.static_layer_key = None
+        self.dirty_surface = None   # 脏矩形渲染时代替屏幕的绘制目标
 
 
     def setupGroups(self):
@@ -97,10 +192,16 @@ class Level(tool.State):
 
         # 改用列表生成器直接生成内容，不再在这里使用for循环
         self.plant_groups = [pg.sprite.Group() for i in range(self.map_y_len)]
-        self.zombie_groups = [pg.sprite.Group() for i in range(self.map_y_len)]
+        self.zombie_groups = [zombie.ZombieGroup() for i in range(self.map_y_len)]
         self.hypno_zombie_groups = [pg.sprite.Group() for i in range(self.map_y_len)] # 被魅惑的僵尸
         self.bullet_groups = [pg.sprite.Group() for i in range(self.map_y_len)]
 
+        # 绘制顺序：按行从上到下，每行内依次为植物、僵尸、被魅惑的僵尸、子弹，最后是掉落的僵尸头与阳光
+        # 精灵生成、死亡或换行时由各精灵组自身维护，绘制时按这一顺序合并为一次blits
+        self.row_render_groups = [(self.plant_groups[i], self.zombie_groups[i],
+                                   self.hypno_zombie_groups[i], self.bullet_groups[i])
+                                  for i in range(self.map_y_len)]
+        self.top_render_groups = (self.head_group, self.sun_group)
 
     # 按照规则生成每一波僵尸
     # 将波刷新和一波中的僵尸生成分开
@@ -143,7 +244,7 @@ class Level(tool.State):
             min_cost = c.CREATE_ZOMBIE_DICT[min(useable_zombies, key=lambda x:c.CREATE_ZOMBIE_DICT[x][0])][0]
 
             while (zombie_volume >= min_cost) and (len(zombie_list) < 50):
-                new_zombie = random.choices(useable_zombies, weights)[0]
+                new_zombie = self.random.choices(useable_zombies, weights)[0]
                 # 普通僵尸、路障僵尸、铁桶僵尸有概率生成水中变种
                 if self.background_type in c.POOL_EQUIPPED_BACKGROUNDS:
                     # 有泳池第一轮的第四波设定上生成水生僵尸
@@ -151,7 +252,7 @@ class Level(tool.State):
                         if new_zombie in c.CONVERT_ZOMBIE_IN_POOL:
                             new_zombie = c.CONVERT_ZOMBIE_IN_POOL[new_zombie]
                     elif survival_rounds > 0 or wave > 4:
-                        if random.randint(1, 3) == 1:  # 1/3概率水上，暂时人为设定
+                        if self.random.randint(1, 3) == 1:  # 1/3概率水上，暂时人为设定
                             if new_zombie in c.CONVERT_ZOMBIE_IN_POOL:
                                 new_zombie = c.CONVERT_ZOMBIE_IN_POOL[new_zombie]
                     # 首先几轮不出水生僵尸
@@ -196,14 +297,14 @@ class Level(tool.State):
                                     elif c.GRAVE not in self.map.map[map_y][map_x][c.MAP_PLANT]:
                                         occupied.append((map_x, map_y))
                             if unoccupied:
-                                target = unoccupied[random.randint(0, len(unoccupied) - 1)]
+                                target = unoccupied[self.random.randint(0, len(unoccupied) - 1)]
                                 map_x, map_y = target
                                 posX, posY = self.map.getMapGridPos(map_x, map_y)
-                                self.plant_groups[map_y].add(plant.Grave(posX, posY))
+                                self.plant_groups[map_y].add(plant.Grave(posX, posY, self.random))
                                 self.map.map[map_y][map_x][c.MAP_PLANT].add(c.GRAVE)
                                 self.grave_set.add((map_x, map_y))
                             elif occupied:
-                                target = occupied[random.randint(0, len(occupied) - 1)]
+                                target = occupied[self.random.randint(0, len(occupied) - 1)]
                                 map_x, map_y = target
                                 posX, posY = self.map.getMapGridPos(map_x, map_y)
                                 for i in self.plant_groups[map_y]:
@@ -212,7 +313,7 @@ class Level(tool.State):
                                         # 不杀死毁灭菇坑和冰道
                                         if i.name not in exception_objects:
                                             i.health = 0
-                                self.plant_groups[map_y].add(plant.Grave(posX, posY))
+                                self.plant_groups[map_y].add(plant.Grave(posX, posY, self.random))
                                 self.map.map[map_y][map_x][c.MAP_PLANT].add(c.GRAVE)
                                 self.grave_set.add((map_x, map_y))
                             self.new_grave_added = True
@@ -222,27 +323,27 @@ class Level(tool.State):
                         for item in self.grave_set:
                             item_x, item_y = self.map.getMapGridPos(*item)
                             # 目前设定：1/2概率普通僵尸，1/2概率路障僵尸
-                            if random.randint(0, 1):
-                                self.zombie_groups[item[1]].add(zombie.NormalZombie(item_x, item_y, self.head_group))
+                            if self.random.randint(0, 1):
+                                self.zombie_groups[item[1]].add(zombie.NormalZombie(item_x, item_y, self.head_group, self.random))
                             else:
-                                self.zombie_groups[item[1]].add(zombie.ConeHeadZombie(item_x, item_y, self.head_group))
+                                self.zombie_groups[item[1]].add(zombie.ConeHeadZombie(item_x, item_y, self.head_group, self.random))
                         self.grave_zombie_created = True
             elif self.map_data[c.BACKGROUND_TYPE] in c.POOL_EQUIPPED_BACKGROUNDS:
                 if not self.created_zombie_from_pool:
                     if current_time - self.wave_time > 1500:
                         for i in range(3):
                             # 水中倒数四列内可以在此时产生僵尸。共产生3个
-                            map_x, map_y = random.randint(5, 8), random.randint(2, 3)
+                            map_x, map_y = self.random.randint(5, 8), self.random.randint(2, 3)
                             item_x, item_y = self.map.getMapGridPos(map_x, map_y)
                             # 用随机数指定产生的僵尸类型
                             # 暂时设定为生成概率相同
-                            zombie_type = random.randint(1, 3)
+                            zombie_type = self.random.randint(1, 3)
                             if zombie_type == 1:
-                                self.zombie_groups[map_y].add(zombie.BucketHeadDuckyTubeZombie(item_x, item_y, self.head_group))
+                                self.zombie_groups[map_y].add(zombie.BucketHeadDuckyTubeZombie(item_x, item_y, self.head_group, self.random))
                             elif zombie_type == 2:
-                                self.zombie_groups[map_y].add(zombie.ConeHeadDuckyTubeZombie(item_x, item_y, self.head_group))
+                                self.zombie_groups[map_y].add(zombie.ConeHeadDuckyTubeZombie(item_x, item_y, self.head_group, self.random))
                             else:
-                                self.zombie_groups[map_y].add(zombie.DuckyTubeZombie(item_x, item_y, self.head_group))
+                                self.zombie_groups[map_y].add(zombie.DuckyTubeZombie(item_x, item_y, self.head_group, self.random))
                         self.created_zombie_from_pool = True
             return
 
@@ -266,7 +367,7 @@ class Level(tool.State):
                     c.SOUND_ZOMBIE_COMING.play()
             return
         if (self.wave_num % 10 != 9):
-            if ((current_time - self.wave_time >= 25000 + random.randint(0, 6000)) or (self.bar_type == c.CHOOSEBAR_BOWLING and current_time - self.wave_time >= 12500 + random.randint(0, 3000))):
+            if ((current_time - self.wave_time >= 25000 + self.random.randint(0, 6000)) or (self.bar_type == c.CHOOSEBAR_BOWLING and current_time - self.wave_time >= 12500 + self.random.randint(0, 3000))):
                 self.wave_num += 1
                 self.wave_time = current_time
                 self.wave_zombies = self.waves[self.wave_num - 1]
@@ -287,7 +388,7 @@ class Level(tool.State):
         zombie_nums = 0
         for i in range(self.map_y_len):
             zombie_nums += len(self.zombie_groups[i])
-        if self.zombie_num and (zombie_nums / self.zombie_num < random.uniform(0.15, 0.25)) and (current_time - self.wave_time > 4000):
+        if self.zombie_num and (zombie_nums / self.zombie_num < self.random.uniform(0.15, 0.25)) and (current_time - self.wave_time > 4000):
             # 当僵尸所剩无几并且时间过了4000 ms以上时，改变时间记录，使得2000 ms后刷新僵尸（所以需要判断剩余时间是否大于2000 ms）
             if self.bar_type == c.CHOOSEBAR_STATIC:
                 if current_time - 43000 < self.wave_time:    # 判断剩余时间是否有2000 ms
@@ -316,14 +417,17 @@ class Level(tool.State):
 
     # 更新函数每帧被调用，将鼠标事件传入给状态处理函数
     def update(self, surface, current_time, mouse_pos, mouse_click):
+        self.step(current_time, mouse_pos, mouse_click)
+        self.draw(surface)
+
+    # 推进一次游戏逻辑，不绘制
+    def step(self, current_time, mouse_pos, mouse_click):
         self.current_time = self.game_info[c.CURRENT_TIME] = self.gameTime(current_time)
         if self.state == c.CHOOSE:
             self.choose(mouse_pos, mouse_click)
         elif self.state == c.PLAY:
             self.play(mouse_pos, mouse_click)
 
-        self.draw(surface)
-
     def gameTime(self, current_time):
         # 扣除暂停时间
         if not self.pause:
@@ -355,11 +459,13 @@ class Level(tool.State):
 
     def initChoose(self):
         self.state = c.CHOOSE
+        # 选卡期间任何可选植物都可能被带入关卡
+        self.loadGfxManifest(self.getPlantPool(self.map_data))
         self.panel = menubar.Panel(c.CARDS_TO_CHOOSE, self.map_data[c.INIT_SUN_NAME], self.background_type)
 
         # 播放选卡音乐
         pg.mixer.music.stop()
-        pg.mixer.music.load(os.path.join(c.PATH_MUSIC_DIR, "chooseYourSeeds.opus"))
+        pack.load_music(os.path.join(c.PATH_MUSIC_DIR, "chooseYourSeeds.opus"))
         pg.mixer.music.play(-1, 0)
         pg.mixer.music.set_volume(self.game_info[c.SOUND_VOLUME])
 
@@ -378,10 +484,15 @@ class Level(tool.State):
                 c.SOUND_BUTTON_CLICK.play()
 
     def initPlay(self, card_list):
+        # 选卡结束后只保留实际带入的植物
+        if self.bar_type == c.CHOOSEBAR_STATIC:
+            self.loadGfxManifest(c.PLANT_CARD_INFO[index][c.PLANT_NAME_INDEX] for index in card_list)
+        else:
+            self.loadGfxManifest(card_info[c.PLANT_NAME_INDEX] for card_info in card_list)
 
         # 播放bgm
         pg.mixer.music.stop()
-        pg.mixer.music.load(os.path.join(c.PATH_MUSIC_DIR, self.bgm))
+        pack.load_music(os.path.join(c.PATH_MUSIC_DIR, self.bgm))
         pg.mixer.music.play(-1, 0)
         pg.mixer.music.set_volume(self.game_info[c.SOUND_VOLUME])
 
@@ -389,7 +500,7 @@ class Level(tool.State):
         if self.bar_type == c.CHOOSEBAR_STATIC:
             self.menubar = menubar.MenuBar(card_list, self.map_data[c.INIT_SUN_NAME])
         else:
-            self.menubar = menubar.MoveBar(card_list)
+            self.menubar = menubar.MoveBar(card_list, self.random)
 
         # 是否拖住植物或者铲子
         self.drag_plant = False
@@ -462,14 +573,14 @@ class Level(tool.State):
             grave_volume = c.GRAVES_GRADE_INFO[grade_graves]
             self.grave_set = set()
             while len(self.grave_set) < grave_volume:
-                map_x = random.randint(4, 8)    # 注意是从0开始编号
-                map_y = random.randint(0, 4)
+                map_x = self.random.randint(4, 8)    # 注意是从0开始编号
+                map_y = self.random.randint(0, 4)
                 self.grave_set.add((map_x, map_y))
             if self.grave_set:
                 for i in self.grave_set:
                     map_x, map_y = i
                     posX, posY = self.map.getMapGridPos(map_x, map_y)
-                    self.plant_groups[map_y].add(plant.Grave(posX, posY))
+                    self.plant_groups[map_y].add(plant.Grave(posX, posY, self.random))
                     self.map.map[map_y][map_x][c.MAP_PLANT].add(c.GRAVE)
             self.grave_zombie_created = False
             self.new_grave_added = False
@@ -498,8 +609,7 @@ class Level(tool.State):
         self.return_button_rect = self.return_button.get_rect()
         self.return_button_rect.x = 220
         self.return_button_rect.y = 440
-        font = pg.font.Font(c.FONT_PATH, 40)
-        font.bold = True
+        font = tool.get_font(40, bold=True)
         text = font.render("返回游戏", True, c.YELLOWGREEN)
         text_rect = text.get_rect()
         text_rect.x = 105
@@ -522,8 +632,7 @@ class Level(tool.State):
 
         # 音量+、音量-
         frame_rect = (0, 0, 39, 41)
-        font = pg.font.Font(c.FONT_PATH, 35)
-        font.bold = True
+        font = tool.get_font(35, bold=True)
         # 音量+
         self.sound_volume_plus_button = tool.get_image_alpha(tool.GFX[c.SOUND_VOLUME_BUTTON], *frame_rect, c.BLACK)
         sign = font.render("+", True, c.YELLOWGREEN)
@@ -696,9 +805,9 @@ class Level(tool.State):
         
         if self.produce_sun:
             # 原版阳光掉落机制：(已掉落阳光数*100 ms + 4250 ms) 与 9500 ms的最小值，再加 0 ~ 2750 ms 之间的一个数
-            if (self.current_time - self.sun_timer) > min(c.PRODUCE_SUN_INTERVAL + 100*self.fallen_sun, 9500) + random.randint(0, 2750):
+            if (self.current_time - self.sun_timer) > min(c.PRODUCE_SUN_INTERVAL + 100*self.fallen_sun, 9500) + self.random.randint(0, 2750):
                 self.sun_timer = self.current_time
-                map_x, map_y = self.map.getRandomMapIndex()
+                map_x, map_y = self.map.getRandomMapIndex(self.random)
                 x, y = self.map.getMapGridPos(map_x, map_y)
                 self.sun_group.add(plant.Sun(x, 0, x, y))
                 self.fallen_sun += 1
@@ -781,19 +890,19 @@ class Level(tool.State):
             # 0, 1, 4, 5路为陆路，2, 3路为水路
             if self.map_data[c.BACKGROUND_TYPE] in c.POOL_EQUIPPED_BACKGROUNDS:
                 if name in c.WATER_ZOMBIE:
-                    map_y = random.randint(2, 3)
+                    map_y = self.random.randint(2, 3)
                 elif name == "这里应该换成气球僵尸的名字（最好写调用的变量名，最好不要直接写，保持风格统一）":
-                    map_y = random.randint(0, 5)
+                    map_y = self.random.randint(0, 5)
                 else:   # 陆生僵尸
-                    map_y = random.randint(0, 3)
+                    map_y = self.random.randint(0, 3)
                     if map_y >= 2:   # 后两路的map_y应当+2
                         map_y += 2
             elif self.map_data[c.BACKGROUND_TYPE] == c.BACKGROUND_SINGLE:
                 map_y = 2
             elif self.map_data[c.BACKGROUND_TYPE] == c.BACKGROUND_TRIPLE:
-                map_y = random.randint(1, 3)
+                map_y = self.random.randint(1, 3)
             else:
-                map_y = random.randint(0, 4)
+                map_y = self.random.randint(0, 4)
 
         if self.map_data[c.SPAWN_ZOMBIES] == c.SPAWN_ZOMBIES_AUTO:
             # 旗帜波出生点右移
@@ -808,40 +917,40 @@ class Level(tool.State):
         # 新增的僵尸也需要在这里声明
         match name:
             case c.NORMAL_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.NormalZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.NormalZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.CONEHEAD_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.ConeHeadZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.ConeHeadZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.BUCKETHEAD_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.BucketHeadZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.BucketHeadZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.FLAG_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.FlagZombie(c.ZOMBIE_START_X, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.FlagZombie(c.ZOMBIE_START_X, y, self.head_group, self.random))
             case c.NEWSPAPER_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.NewspaperZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.NewspaperZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.FOOTBALL_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.FootballZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.FootballZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.DUCKY_TUBE_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.DuckyTubeZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.DuckyTubeZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.CONEHEAD_DUCKY_TUBE_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.ConeHeadDuckyTubeZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.ConeHeadDuckyTubeZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.BUCKETHEAD_DUCKY_TUBE_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.BucketHeadDuckyTubeZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.BucketHeadDuckyTubeZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.SCREEN_DOOR_ZOMBIE:
-                self.zombie_groups[map_y].add(zombie.ScreenDoorZombie(c.ZOMBIE_START_X + random.randint(-20, 20) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.ScreenDoorZombie(c.ZOMBIE_START_X + self.random.randint(-20, 20) + huge_wave_move, y, self.head_group, self.random))
             case c.POLE_VAULTING_ZOMBIE:
                 # 本来撑杆跳生成位置不同，对齐左端可认为修正了一部分（看作移动了70），只需要相对修改即可
-                self.zombie_groups[map_y].add(zombie.PoleVaultingZombie(c.ZOMBIE_START_X + random.randint(0, 10) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.PoleVaultingZombie(c.ZOMBIE_START_X + self.random.randint(0, 10) + huge_wave_move, y, self.head_group, self.random))
             case c.ZOMBONI:
                 # 冰车僵尸生成位置不同
-                self.zombie_groups[map_y].add(zombie.Zomboni(c.ZOMBIE_START_X + random.randint(0, 10) + huge_wave_move, y, self.plant_groups[map_y], self.map, plant.IceFrozenPlot))
+                self.zombie_groups[map_y].add(zombie.Zomboni(c.ZOMBIE_START_X + self.random.randint(0, 10) + huge_wave_move, y, self.plant_groups[map_y], self.map, plant.IceFrozenPlot, self.random))
             case c.SNORKELZOMBIE:
                 # 潜水僵尸生成位置不同
-                self.zombie_groups[map_y].add(zombie.SnorkelZombie(c.ZOMBIE_START_X + random.randint(0, 10) + huge_wave_move, y, self.head_group))
+                self.zombie_groups[map_y].add(zombie.SnorkelZombie(c.ZOMBIE_START_X + self.random.randint(0, 10) + huge_wave_move, y, self.head_group, self.random))
 
     # 能否种植物的判断：
     # 先判断位置是否合法 isValid(map_x, map_y)
     # 再判断位置是否可用 isMovable(map_x, map_y)
     def canSeedPlant(self, plant_name):
-        x, y = pg.mouse.get_pos()
+        x, y = tool.get_mouse_pos()
         return self.map.checkPlantToSeed(x, y, plant_name)
 
     # 种植物
@@ -895,9 +1004,9 @@ class Level(tool.State):
             case c.HYPNOSHROOM:
                 new_plant = plant.HypnoShroom(x, y)
             case c.WALLNUTBOWLING:
-                new_plant = plant.WallNutBowling(x, y, map_y, self)
+                new_plant = plant.WallNutBowling(x, y, map_y, self, self.random)
             case c.REDWALLNUTBOWLING:
-                new_plant = plant.RedWallNutBowling(x, y)
+                new_plant = plant.RedWallNutBowling(x, y, self.random)
             case c.LILYPAD:
                 new_plant = plant.LilyPad(x, y)
             case c.TORCHWOOD:
@@ -926,7 +1035,7 @@ class Level(tool.State):
             case c.PUMPKINHEAD:
                 new_plant = plant.PumpkinHead(x, y)
             case c.GIANTWALLNUT:
-                new_plant = plant.GiantWallNut(x, y)
+                new_plant = plant.GiantWallNut(x, y, self.random)
 
 
         if ((new_plant.name in c.CAN_SLEEP_PLANTS)
@@ -1014,7 +1123,7 @@ class Level(tool.State):
                 collided_func = pg.sprite.collide_mask
                 if bullet.state == c.FLY:
                     # 利用循环而非内建精灵组碰撞判断函数，处理更加灵活，可排除已死亡僵尸
-                    for zombie in self.zombie_groups[i]:
+                    for zombie in self.zombie_groups[i].inRange(bullet.rect.x, bullet.rect.right):
                         if (zombie.name == c.SNORKELZOMBIE) and (zombie.frames == zombie.swim_frames):
                             continue
                         if collided_func(zombie, bullet):
@@ -1023,7 +1132,8 @@ class Level(tool.State):
                                 bullet.setExplode()
                                 # 火球有溅射伤害
                                 if bullet.name == c.BULLET_FIREBALL:
-                                    for rangeZombie in self.zombie_groups[i]:
+                                    for rangeZombie in self.zombie_groups[i].inRange(bullet.rect.x - c.GRID_X_SIZE // 2,
+                                                                                     bullet.rect.x + c.GRID_X_SIZE // 2):
                                         if abs(rangeZombie.rect.x - bullet.rect.x) <= (c.GRID_X_SIZE // 2):
                                             rangeZombie.setDamage(c.BULLET_DAMAGE_FIREBALL_RANGE, effect=None, damage_type=c.ZOMBIE_DEAFULT_DAMAGE)
                                 break
@@ -1165,7 +1275,7 @@ class Level(tool.State):
                         elif i == self.map_y_len - 1:
                             _move = -1
                         else:
-                            _move = random.randint(0, 1)*2 - 1
+                            _move = self.random.randint(0, 1)*2 - 1
                             if self.map.map[i][0][c.MAP_PLOT_TYPE] != self.map.map[i + _move][0][c.MAP_PLOT_TYPE]:
                                 _move = -(_move)
                         zombie.target_map_y = i + _move
@@ -1195,7 +1305,7 @@ class Level(tool.State):
     def checkCarCollisions(self):
         for i in range(len(self.cars)):
             if self.cars[i]:
-                for zombie in self.zombie_groups[i]:
+                for zombie in self.zombie_groups[i].inRange(self.cars[i].rect.x, self.cars[i].rect.right):
                     if (zombie and zombie.state != c.DIE and (not zombie.losthead)
                     and (pg.sprite.collide_mask(zombie, self.cars[i]))):
                         self.cars[i].setWalk()
@@ -1209,7 +1319,7 @@ class Level(tool.State):
         for i in range(self.map_y_len):
             if abs(i - map_y) > y_range:
                 continue
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(x - x_range, x + x_range):
                 if ((abs(zombie.rect.centerx - x) <= x_range) or
                     ((zombie.rect.right - (x-x_range) > 20) or (zombie.rect.right - (x-x_range))/zombie.rect.width > 0.2, ((x+x_range) - zombie.rect.left > 20) or ((x+x_range) - zombie.rect.left)/zombie.rect.width > 0.2)[zombie.rect.x > x]):  # 这代码不太好懂，后面是一个判断僵尸在左还是在右，前面是一个元组，[0]是在左边的情况，[1]是在右边的情况
                     if effect == c.BULLET_EFFECT_UNICE:
@@ -1290,7 +1400,7 @@ class Level(tool.State):
                 else:
                     target_plant.setIdle()
         elif target_plant.name == c.CHOMPER:
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                 if target_plant.canAttack(zombie):
                     target_plant.setAttack(zombie, self.zombie_groups[i])
                     break
@@ -1307,13 +1417,13 @@ class Level(tool.State):
                         zombie.setDamage(1800, damage_type=c.ZOMBIE_RANGE_DAMAGE)
                 target_plant.boomed = True
         elif target_plant.name == c.SQUASH:
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                 if target_plant.canAttack(zombie):
                     target_plant.setAttack(zombie, self.zombie_groups[i])
                     break
         elif target_plant.name == c.SPIKEWEED:
             can_attack = False
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                 if target_plant.canAttack(zombie):
                     can_attack = True
                     break
@@ -1324,7 +1434,7 @@ class Level(tool.State):
         elif target_plant.name == c.SCAREDYSHROOM:
             need_cry = False
             can_attack = False
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                 if target_plant.needCry(zombie):
                     need_cry = True
                     break
@@ -1350,7 +1460,7 @@ class Level(tool.State):
             elif (target_plant.state == c.ATTACK and not can_attack):
                 target_plant.setIdle()
         elif target_plant.name == c.TANGLEKLEP:
-            for zombie in self.zombie_groups[i]:
+            for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                 if target_plant.canAttack(zombie):
                     target_plant.setAttack(zombie, self.zombie_groups[i])
                     break
@@ -1385,7 +1495,7 @@ class Level(tool.State):
         else:
             can_attack = False
             if (zombie_len > 0):
-                for zombie in self.zombie_groups[i]:
+                for zombie in self.zombie_groups[i].inRange(*target_plant.getAttackRange()):
                     if target_plant.canAttack(zombie):
                         can_attack = True
                         break
@@ -1462,13 +1572,13 @@ class Level(tool.State):
     def drawMouseShow(self, surface):
         if self.hint_plant:
             surface.blit(self.hint_image, self.hint_rect)
-        x, y = pg.mouse.get_pos()
+        x, y = tool.get_mouse_pos()
         self.mouse_rect.centerx = x
         self.mouse_rect.centery = y
         surface.blit(self.mouse_image, self.mouse_rect)
 
     def drawMouseShowPlus(self, surface):   # 拖动铲子时的显示
-        x, y = pg.mouse.get_pos()
+        x, y = tool.get_mouse_pos()
         self.shovel_rect.centerx = x
         self.shovel_rect.centery = y
         # 铲子接近植物时会高亮提示
@@ -1495,9 +1605,21 @@ class Level(tool.State):
                 i.highlight_time = self.current_time
                 return
 
-    def drawZombieFreezeTrap(self, i, surface):
-        for zombie in self.zombie_groups[i]:
-            zombie.drawFreezeTrap(surface)
+    # 按绘制顺序生成本帧所有精灵的(图片, 位置)
+    def getRenderSequence(self):
+        for i, groups in enumerate(self.row_render_groups):
+            for group in groups:
+                for sprite in group:
+                    yield (sprite.image, sprite.rect)
+            # 冰冻僵尸的冰块画在本行精灵之上
+            for zombie in self.zombie_groups[i]:
+                if zombie.state == c.FREEZE:
+                    yield (zombie.ice_trap_image, zombie.ice_trap_rect)
+            if self.cars[i]:
+                yield (self.cars[i].image, self.cars[i].rect)
+        for group in self.top_render_groups:
+            for sprite in group:
+                yield (sprite.image, sprite.rect)
 
 
     def showLevelProgress(self, surface):
@@ -1512,7 +1634,7 @@ class Level(tool.State):
         # 常数为拟合值
         filled_bar_rect = (self.level_progress_zombie_head_image_rect.x + 3, self.level_progress_bar_image_rect.y + 6, int((150 * self.wave_num) / (self.map_data[c.NUM_FLAGS] * 10)) + 5, 9)
         # 画填充的进度条
-        pg.draw.rect(surface, c.YELLOWGREEN, filled_bar_rect)
+        surface.fill(c.YELLOWGREEN, filled_bar_rect)
         
         # 画旗帜
         for i in range(self.num_flags):
@@ -1538,16 +1660,58 @@ class Level(tool.State):
         
         # 显示当前音量
         # 由于音量可变，因此这一内容不能在一开始就结束加载，而应当不断刷新不断显示
-        font = pg.font.Font(c.FONT_PATH, 30)
-        volume_tips = font.render(f"音量：{round(self.game_info[c.SOUND_VOLUME]*100):3}%", True, c.LIGHTGRAY)
+        volume_tips = tool.render_text(f"音量：{round(self.game_info[c.SOUND_VOLUME]*100):3}%", 30, c.LIGHTGRAY)
         volume_tips_rect = volume_tips.get_rect()
         volume_tips_rect.x = 275
         volume_tips_rect.y = 247
         surface.blit(volume_tips, volume_tips_rect)
 
+    # 静态图层的内容由这些值决定，任何一项变化时才重新合成
+    def getStaticLayerKey(self):
+        if self.state == c.PLAY:
+            return (self.state, self.viewport.topleft, self.has_shovel and self.drag_shovel,
+                    self.menubar.getBackgroundKey())
+        return (self.state, self.viewport.topleft)
+
+    # 重新合成了静态图层时返回True
+    def updateStaticLayer(self):
+        key = self.getStaticLayerKey()
+        if key == self.static_layer_key:
+            return False
+        self.static_layer_key = key
+        self.static_layer.blit(self.background, (0,0), self.viewport)
+        if self.state == c.PLAY:
+            if self.has_shovel:
+                # 画铲子槽，拖动中的铲子跟随鼠标绘制
+                self.static_layer.blit(self.shovel_box, self.shovel_box_rect)
+                if not self.drag_shovel:
+                    self.static_layer.blit(self.shovel, self.shovel_rect)
+            # 画小菜单
+            self.static_layer.blit(self.little_menu, self.little_menu_rect)
+            self.menubar.drawBackground(self.static_layer)
+        return True
+
+    # 脏矩形渲染的背景绘制：静态图层变化或刚开始绘制时整屏绘制，否则只在上一帧绘制过的区域恢复静态图层
+    def drawDirtyBackground(self, surface, full):
+        if full or (self.dirty_surface is None) or (self.dirty_surface.surface is not surface):
+            self.dirty_surface = tool.DirtyRectSurface(surface)
+            surface.blit(self.static_layer, (0,0))
+        else:
+            for rect in self.dirty_surface.beginFrame():
+                surface.blit(self.static_layer, rect, rect)
+        return self.dirty_surface
+
+    def getDirtyRects(self):
+        if self.dirty_surface is None:
+            return None
+        return self.dirty_surface.getDirtyRects()
+
     def draw(self, surface):
-        self.level.blit(self.background, self.viewport, self.viewport)
-        surface.blit(self.level, (0,0), self.viewport)
+        rebuilt = self.updateStaticLayer()
+        if c.DIRTY_RECT_RENDERING:
+            surface = self.drawDirtyBackground(surface, rebuilt)
+        else:
+            surface.blit(self.static_layer, (0,0))
         if self.state == c.CHOOSE:
             self.panel.draw(surface)
             # 画小菜单
@@ -1556,24 +1720,8 @@ class Level(tool.State):
                 self.showAllContentOfMenu(surface)
         # 以后可能需要插入一个预备的状态（预览显示僵尸、返回战场）
         elif self.state == c.PLAY:
-            if self.has_shovel:
-                # 画铲子
-                surface.blit(self.shovel_box, self.shovel_box_rect)
-                surface.blit(self.shovel, self.shovel_rect)
-            # 画小菜单
-            surface.blit(self.little_menu, self.little_menu_rect)
-
-            self.menubar.draw(surface)
-            for i in range(self.map_y_len):
-                self.plant_groups[i].draw(surface)
-                self.zombie_groups[i].draw(surface)
-                self.hypno_zombie_groups[i].draw(surface)
-                self.bullet_groups[i].draw(surface)
-                self.drawZombieFreezeTrap(i, surface)
-                if self.cars[i]:
-                    self.cars[i].draw(surface)
-            self.head_group.draw(surface)
-            self.sun_group.draw(surface)
+            self.menubar.drawCards(surface)
+            surface.blits(self.getRenderSequence(), doreturn=False)
 
             if self.drag_plant:
                 self.drawMouseShow(surface)
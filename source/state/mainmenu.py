@@ -2,6 +2,7 @@ import pygame as pg
 import os
 from .. import tool
 from .. import constants as c
+from .. import pack
 
 class Menu(tool.State):
     
@@ -17,13 +18,22 @@ class Menu(tool.State):
         self.setupOptionMenu()
         self.setupSunflowerTrophy()
         pg.mixer.music.stop()
-        pg.mixer.music.load(os.path.join(c.PATH_MUSIC_DIR, "intro.opus"))
+        pack.load_music(os.path.join(c.PATH_MUSIC_DIR, "intro.opus"))
         pg.mixer.music.play(-1, 0)
         pg.display.set_caption(c.ORIGINAL_CAPTION)
         pg.mixer.music.set_volume(self.game_info[c.SOUND_VOLUME])
         for i in c.SOUNDS:
             i.set_volume(self.game_info[c.SOUND_VOLUME])
 
+    def getPreloadGfx(self, persist):
+        names = {c.MAIN_MENU_IMAGE, c.BIG_MENU, c.SOUND_VOLUME_BUTTON, c.TROPHY_SUNFLOWER}
+        for name in (c.OPTION_ADVENTURE, c.LITTLEGAME_BUTTON, c.EXIT, c.OPTION_BUTTON, c.HELP):
+            names.update(f"{name}_{i}" for i in range(2))
+        return names
+
+    def getWarmupSounds(self, persist):
+        return (c.SOUND_BUTTON_CLICK, c.SOUND_EVILLAUGH, c.SOUND_LOSE)
+
     def setupBackground(self):
         frame_rect = (80, 0, 800, 600)
         # 1、形参中加单星号，即f(*x)则表示x为元组，所有对x的操作都应将x视为元组类型进行。
@@ -160,8 +170,7 @@ class Menu(tool.State):
         self.return_button_rect = self.return_button.get_rect()
         self.return_button_rect.x = 220
         self.return_button_rect.y = 440
-        font = pg.font.Font(c.FONT_PATH, 40)
-        font.bold = True
+        font = tool.get_font(40, bold=True)
         text = font.render("返回游戏", True, c.YELLOWGREEN)
         text_rect = text.get_rect()
         text_rect.x = 105
@@ -170,8 +179,7 @@ class Menu(tool.State):
 
         # 音量+、音量-
         frame_rect = (0, 0, 39, 41)
-        font = pg.font.Font(c.FONT_PATH, 35)
-        font.bold = True
+        font = tool.get_font(35, bold=True)
         # 音量+
         self.sound_volume_plus_button = tool.get_image_alpha(tool.GFX[c.SOUND_VOLUME_BUTTON], *frame_rect, c.BLACK)
         sign = font.render("+", True, c.YELLOWGREEN)
@@ -210,14 +218,13 @@ class Menu(tool.State):
         if tool.inArea(self.sunflower_trophy_rect, x, y):
             self.sunflower_trophy_show_info_time = self.current_time
         if (self.current_time - self.sunflower_trophy_show_info_time) < 80:
-            font = pg.font.Font(c.FONT_PATH, 14)
             if (self.game_info[c.LEVEL_COMPLETIONS] and self.game_info[c.LITTLEGAME_COMPLETIONS]):
                 infoText = f"目前您一共完成了：冒险模式{self.game_info[c.LEVEL_COMPLETIONS]}轮，玩玩小游戏{self.game_info[c.LITTLEGAME_COMPLETIONS]}轮"
             elif self.game_info[c.LEVEL_COMPLETIONS]:
                 infoText = f"目前您一共完成了：冒险模式{self.game_info[c.LEVEL_COMPLETIONS]}轮；完成其他所有游戏模式以获得金向日葵奖杯！"
             else:
                 infoText = f"目前您一共完成了：玩玩小游戏{self.game_info[c.LITTLEGAME_COMPLETIONS]}轮；完成其他所有游戏模式以获得金向日葵奖杯！"
-            infoImg = font.render(infoText , True, c.BLACK, c.LIGHTYELLOW)
+            infoImg = tool.render_text(infoText, 14, c.BLACK, c.LIGHTYELLOW)
             infoImg_rect = infoImg.get_rect()
             infoImg_rect.x = self.sunflower_trophy_rect.x
             infoImg_rect.y = self.sunflower_trophy_rect.bottom - 14
@@ -230,8 +237,7 @@ class Menu(tool.State):
 
     def showCurrentVolumeImage(self, surface:pg.Surface):
         # 由于音量可变，因此这一内容不能在一开始就结束加载，而应当不断刷新不断显示
-        font = pg.font.Font(c.FONT_PATH, 30)
-        volume_tips = font.render(f"音量：{round(self.game_info[c.SOUND_VOLUME]*100):3}%", True, c.LIGHTGRAY)
+        volume_tips = tool.render_text(f"音量：{round(self.game_info[c.SOUND_VOLUME]*100):3}%", 30, c.LIGHTGRAY)
         volume_tips_rect = volume_tips.get_rect()
         volume_tips_rect.x = 275
         volume_tips_rect.y = 247
@@ -295,7 +301,7 @@ class Menu(tool.State):
         # 没有点到前两者时常规行检测所有按钮的点击和高亮，前两者能执行也是需要先走这里。
         else:
             # 先检查选项高亮预览
-            x, y = pg.mouse.get_pos()
+            x, y = tool.get_mouse_pos()
             self.checkHilight(x, y)
             if (self.game_info[c.LEVEL_COMPLETIONS] or self.game_info[c.LITTLEGAME_COMPLETIONS]):
                 self.checkSunflowerTrophyInfo(surface, x, y)
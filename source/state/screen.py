@@ -3,6 +3,7 @@ import pygame as pg
 from abc import abstractmethod
 from .. import tool
 from .. import constants as c
+from .. import pack
 
 class Screen(tool.State):
     def __init__(self):
@@ -26,7 +27,7 @@ class Screen(tool.State):
         self.main_menu_button_image_rect = self.main_menu_button_image.get_rect()
         self.main_menu_button_image_rect.x = 620
         ### 主菜单按钮上的文字
-        font = pg.font.Font(c.FONT_PATH, 18)
+        font = tool.get_font(18)
         main_menu_text = font.render("主菜单", True, c.NAVYBLUE)
         main_menu_text_rect = main_menu_text.get_rect()
         main_menu_text_rect.x = 29
@@ -75,7 +76,7 @@ class GameVictoryScreen(Screen):
         self.setupImage(self.image_name)
         pg.display.set_caption("pypvz: 战斗胜利！")
         pg.mixer.music.stop()
-        pg.mixer.music.load(os.path.join(c.PATH_MUSIC_DIR, "zenGarden.opus"))
+        pack.load_music(os.path.join(c.PATH_MUSIC_DIR, "zenGarden.opus"))
         pg.mixer.music.play(-1, 0)
         pg.mixer.music.set_volume(self.game_info[c.SOUND_VOLUME])
 
@@ -107,7 +108,7 @@ class AwardScreen(tool.State):
 
         # 文字
         # 标题处文字
-        font = pg.font.Font(c.FONT_PATH, 37)
+        font = tool.get_font(37)
         title_text = font.render("您获得了新的战利品！", True, c.PARCHMENT_YELLOW)
         title_text_rect = title_text.get_rect()
         title_text_rect.x = 220
@@ -123,7 +124,7 @@ class AwardScreen(tool.State):
             self.main_menu_button_image_rect.x = 343
             self.main_menu_button_image_rect.y = 520
             ### 主菜单按钮上的文字
-            font = pg.font.Font(c.FONT_PATH, 18)
+            font = tool.get_font(18)
             main_menu_text = font.render("主菜单", True, c.NAVYBLUE)
             main_menu_text_rect = main_menu_text.get_rect()
             main_menu_text_rect.x = 29
@@ -149,7 +150,7 @@ class AwardScreen(tool.State):
             self.image.blit(sunflower_trophy_image, sunflower_trophy_rect)
 
             # 绘制介绍标题
-            font = pg.font.Font(c.FONT_PATH, 22)
+            font = tool.get_font(22)
             intro_title_img = font.render(intro_title, True, c.PARCHMENT_YELLOW)
             intro_title_rect = intro_title_img.get_rect()
             intro_title_rect.x = 333
@@ -157,7 +158,7 @@ class AwardScreen(tool.State):
             self.image.blit(intro_title_img, intro_title_rect)
 
             # 绘制介绍内容
-            font = pg.font.Font(c.FONT_PATH, 15)
+            font = tool.get_font(15)
             intro_content_img = font.render(intro_content, True, c.NAVYBLUE)
             intro_content_rect = intro_content_img.get_rect()
             intro_content_rect.x = 290
@@ -169,7 +170,7 @@ class AwardScreen(tool.State):
             self.next_button_image_rect = self.next_button_image.get_rect()
             self.next_button_image_rect.x = 70
             ### 继续按钮上的文字
-            font = pg.font.Font(c.FONT_PATH, 18)
+            font = tool.get_font(18)
             next_text = font.render("继续", True, c.NAVYBLUE)
             next_text_rect = next_text.get_rect()
             next_text_rect.x = 37
@@ -198,7 +199,7 @@ class AwardScreen(tool.State):
         self.setupImage()
         pg.display.set_caption("pypvz: 您获得了新的战利品！")
         pg.mixer.music.stop()
-        pg.mixer.music.load(os.path.join(c.PATH_MUSIC_DIR, "zenGarden.opus"))
+        pack.load_music(os.path.join(c.PATH_MUSIC_DIR, "zenGarden.opus"))
         pg.mixer.music.play(-1, 0)
         pg.mixer.music.set_volume(self.game_info[c.SOUND_VOLUME])
 
@@ -242,7 +243,7 @@ class HelpScreen(tool.State):
         self.main_menu_button_image_rect.x = 343
         self.main_menu_button_image_rect.y = 500
         ### 主菜单按钮上的文字
-        font = pg.font.Font(c.FONT_PATH, 18)
+        font = tool.get_font(18)
         main_menu_text = font.render("主菜单", True, c.NAVYBLUE)
         main_menu_text_rect = main_menu_text.get_rect()
         main_menu_text_rect.x = 29
@@ -257,3 +258,43 @@ class HelpScreen(tool.State):
             if tool.inArea(self.main_menu_button_image_rect, *mouse_pos):
                 self.next = c.MAIN_MENU
                 self.done = True
+
+# 加载界面：在后台导入下一个状态所需的图片并显示进度，全部完成后才转到该状态
+class LoadScreen(tool.State):
+    def __init__(self):
+        tool.State.__init__(self)
+        self.target = c.MAIN_MENU
+        self.names = ()
+
+    # 由状态机在进入加载界面前指定目标状态及需要导入的图片
+    def setTarget(self, target, names):
+        self.target = target
+        self.names = names
+
+    def startup(self, current_time, persist):
+        self.start_time = current_time
+        self.persist = persist
+        self.game_info = persist
+        self.next = self.target
+        self.loader = tool.GFXLoader(tool.GFX, self.names)
+        pg.display.set_caption("pypvz: 加载中……")
+
+    def cleanup(self):
+        self.loader.close()
+        return tool.State.cleanup(self)
+
+    def update(self, surface, current_time, mouse_pos, mouse_click):
+        if self.loader.pump(c.LOAD_SCREEN_PUMP_TIME):
+            self.done = True
+
+        surface.fill(c.BLACK)
+        text = tool.render_text(f"加载中……{int(self.loader.progress * 100)}%", 24, c.WHITE)
+        text_rect = text.get_rect(center=(c.SCREEN_WIDTH // 2, c.SCREEN_HEIGHT // 2 - 30))
+        surface.blit(text, text_rect)
+        # 进度条
+        bar_rect = pg.Rect(0, 0, 400, 16)
+        bar_rect.center = (c.SCREEN_WIDTH // 2, c.SCREEN_HEIGHT // 2 + 10)
+        pg.draw.rect(surface, c.WHITE, bar_rect, 1)
+        progress_rect = bar_rect.inflate(-4, -4)
+        progress_rect.width = int(progress_rect.width * self.loader.progress)
+        pg.draw.rect(surface, c.WHITE, progress_rect)
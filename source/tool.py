@@ -2,10 +2,23 @@ import sqlite3
 import logging
 import os
 import json
+import hashlib
+import mmap
+import struct
+import threading
+import weakref
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
 from abc import abstractmethod
+from collections import OrderedDict
+from collections.abc import Mapping
 import pygame as pg
 from pygame.locals import *
 from . import constants as c
+from . import pack
+from . import sound
+from . import replay
 logger = logging.getLogger("main") 
 
 class UserDataDB:  
@@ -139,6 +152,8 @@ class State():
         self.next = None    # 表示这个状态退出后要转到的下一个状态
         self.persist = {}   # 在状态间转换时需要传递的数据
         self.db = None
+        # 为True时状态机以固定时间步长多次调用step推进逻辑，再单独调用draw绘制
+        self.fixed_timestep = False
 
     # 当从其他状态进入这个状态时，需要进行的初始化操作
     @abstractmethod
@@ -155,6 +170,18 @@ class State():
         # 前面加了@abstractmethod表示抽象基类中必须要重新定义的method
         pass
 
+    # 进入这个状态前需要导入的图片名称，存在尚未导入的图片时状态机会先进入加载界面
+    def getPreloadGfx(self, persist:dict) -> set[str]:
+        return set()
+
+    # 进入这个状态前预先解码的音效
+    def getWarmupSounds(self, persist:dict) -> tuple:
+        return ()
+
+    # 本帧需要更新到显示的区域，为None时更新整个窗口
+    def getDirtyRects(self) -> list[pg.Rect] | None:
+        return None
+
     # 用户数据保存函数
     def saveUserData(self):
         try:  
@@ -185,6 +212,14 @@ class Control():
 
         # 50为目前的基础帧率，乘以倍率即是游戏帧率
         self.fps = 120 * self.game_info[c.GAME_RATE]
+        # 固定时间步长所用：上一次计时的时刻，以及尚未推进的游戏时间
+        self.last_ticks = 0
+        self.simulation_lag = 0
+        # 本帧开始时的计时，录制与回放输入时以它为准
+        self.frame_ticks = 0
+        self.recorder = None    # 录制输入时的记录器
+        self.turbo_rate = 1     # 快进倍率
+        self.replayer = None    # 回放输入时的回放器
 
     def loadUserData(self):  
         try:  
@@ -281,73 +316,256 @@ class Control():
 
     def setup_states(self, state_dict:dict, start_state):
         self.state_dict = state_dict
-        self.state_name = start_state
+        self.state_name = self.routeState(start_state, self.game_info)
         self.state = self.state_dict[self.state_name]
         if hasattr(self.state, 'db'):  
             self.state.db = self.db  
+        sound.warmup(self.state.getWarmupSounds(self.game_info))
         self.state.startup(self.current_time, self.game_info)
+        # 部分界面启动时会重设窗口标题
+        if self.turbo_rate != 1:
+            self.setTurboRate(self.turbo_rate)
+
+    # 录制本次游戏的输入，未指定随机数种子时先确定一个，使录制的游戏可以复现
+    def startRecording(self, path:str):
+        if self.game_info.get(c.RANDOM_SEED) is None:
+            self.game_info[c.RANDOM_SEED] = random.randrange(2**32)
+        self.recorder = replay.InputRecorder(path, self.game_info, self.turbo_rate)
+
+    # 回放输入记录，还原录制时的用户数据；回放不写入存档
+    def startReplay(self, path:str, max_speed:bool=False):
+        self.replayer = replay.InputReplayer(path, max_speed)
+        self.game_info.update(self.replayer.game_info)
+        self.setTurboRate(self.replayer.turbo_rate)
+        self.fps = 120 * self.game_info[c.GAME_RATE]
+        self.cleanup()
+        self.db = None
 
     def run(self):
         while not self.done:
-            self.event_loop()
-            self.update()
-            pg.display.update()
+            if self.replayer is None:
+                self.event_loop()
+            else:
+                self.replayFrame()
+                if self.done:
+                    break
+            if self.state.fixed_timestep and not self.state.done:
+                self.fixedUpdate()
+            else:
+                self.update()
+            rects = self.state.getDirtyRects()
+            if rects is None:
+                pg.display.update()
+            else:
+                pg.display.update(rects)
             self.postUpdate()
+        # 退出游戏时当前状态同样需要清理，例如取消加载界面尚未开始的解码
+        self.state.cleanup()
+        if self.recorder is not None:
+            self.recorder.close()
 
     def update(self):
         # 自 pygame_init() 调用以来的毫秒数 * 游戏速度倍率，即游戏时间
-        self.current_time = pg.time.get_ticks() * self.game_info[c.GAME_RATE]
+        self.last_ticks = self.frame_ticks
+        self.simulation_lag = 0
+        self.current_time = self.last_ticks * self.game_info[c.GAME_RATE]
 
         if self.state.done:
             self.flip_state()
         self.state.update(self.screen, self.current_time, self.mouse_pos, self.mouse_click)
 
-    def postUpdate(self):
+    # 固定时间步长：按实际经过的时间(乘以游戏速度倍率)推进若干次逻辑，再绘制一次
+    def fixedUpdate(self):
+        ticks = self.frame_ticks
+        self.simulation_lag += (ticks - self.last_ticks) * self.game_info[c.GAME_RATE] * self.turbo_rate
+        self.last_ticks = ticks
+
+        # 快进时中间的逻辑步不绘制，只在最后绘制一次
+        steps = 0
+        while (self.simulation_lag >= c.SIMULATION_TICK) and (not self.state.done):
+            if steps >= c.MAX_SIMULATION_STEPS * self.turbo_rate:
+                self.simulation_lag = 0
+                break
+            self.current_time += c.SIMULATION_TICK
+            self.simulation_lag -= c.SIMULATION_TICK
+            self.state.step(self.current_time, self.mouse_pos, self.mouse_click)
+            steps += 1
+            # 鼠标点击只交给一次逻辑处理
+            self.clearMouse()
+        self.state.draw(self.screen)
+
+    def setTurboRate(self, rate:int):
+        # 倍率不大于0时逻辑永远不会推进
+        if rate not in c.TURBO_RATES:
+            raise ValueError(f"快进倍率只能是{c.TURBO_RATES}之一")
+        self.turbo_rate = rate
+        if rate == 1:
+            pg.display.set_caption(c.ORIGINAL_CAPTION)
+        else:
+            pg.display.set_caption(f"{c.ORIGINAL_CAPTION} (快进 x{rate})")
+
+    def clearMouse(self):
         self.mouse_pos = None
         self.mouse_click[0] = False
         self.mouse_click[1] = False
 
-        self.clock.tick(self.fps)
+    def postUpdate(self):
+        # 固定时间步长时，本帧没有推进逻辑的点击留到下一帧处理
+        if self.state.fixed_timestep:
+            fps = c.RENDER_FPS
+        else:
+            self.clearMouse()
+            fps = self.fps
+        # 回放时由回放器控制速度
+        if self.replayer is None:
+            self.clock.tick(fps)
 
     def event_loop(self):
+        click = None    # (位置, 左键, 右键)
+        keys = []
+        quit = False
         for event in pg.event.get():
             if event.type == pg.QUIT:
-                self.done = True
+                quit = True
             elif event.type == pg.KEYDOWN:
                 self.keys = pg.key.get_pressed()
-                if event.key == pg.K_f:
-                    pg.display.set_mode(c.SCREEN_SIZE, pg.HWSURFACE|pg.FULLSCREEN)
-                elif event.key == pg.K_u:
-                    pg.display.set_mode(c.SCREEN_SIZE)
-                elif event.key == pg.K_p:
-                    self.state.next = c.GAME_VICTORY
-                    self.state.done = True
-                elif event.key == pg.K_l:
-                    self.state.next = c.GAME_LOSE
-                    self.state.done = True
-                elif event.key == pg.K_a:
-                    self.state.next = c.AWARD_SCREEN
-                    self.state.done = True
+                keys.append(event.key)
             elif event.type == pg.KEYUP:
                 self.keys = pg.key.get_pressed()
             elif event.type == pg.MOUSEBUTTONDOWN:
-                self.mouse_pos = pg.mouse.get_pos()
-                self.mouse_click[0], _, self.mouse_click[1] = pg.mouse.get_pressed()
-                # self.mouse_click[0]表示左键，self.mouse_click[1]表示右键
-                print(f"点击位置: ({self.mouse_pos[0]:3}, {self.mouse_pos[1]:3}) 左右键点击情况: {self.mouse_click}")
+                left, _, right = pg.mouse.get_pressed()
+                click = (pg.mouse.get_pos(), left, right)
+                print(f"点击位置: ({click[0][0]:3}, {click[0][1]:3}) 左右键点击情况: {[left, right]}")
+        self.frame_ticks = pg.time.get_ticks()
+        set_cursor_pos(pg.mouse.get_pos())
+        if self.recorder is not None:
+            self.recorder.recordFrame(self.frame_ticks, get_mouse_pos(), click, keys, quit)
+        self.applyInput(click, keys, quit)
+
+    # 取出输入记录中的下一帧，记录结束时结束游戏
+    def replayFrame(self):
+        # 回放时仍需处理窗口事件，否则窗口会被系统视为无响应；实际输入只响应关闭窗口以中止回放
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                self.done = True
+                return
+        frame = self.replayer.nextFrame()
+        if frame is None:
+            self.done = True
+            return
+        self.frame_ticks, cursor_pos, click, keys, quit = frame
+        set_cursor_pos(cursor_pos)
+        self.applyInput(click, keys, quit)
+
+    def applyInput(self, click:tuple | None, keys:list[int], quit:bool):
+        if quit:
+            self.done = True
+        for key in keys:
+            if key == pg.K_f:
+                pg.display.set_mode(c.SCREEN_SIZE, pg.HWSURFACE|pg.FULLSCREEN)
+            elif key == pg.K_u:
+                pg.display.set_mode(c.SCREEN_SIZE)
+            elif key == pg.K_p:
+                self.state.next = c.GAME_VICTORY
+                self.state.done = True
+            elif key == pg.K_l:
+                self.state.next = c.GAME_LOSE
+                self.state.done = True
+            elif key == pg.K_a:
+                self.state.next = c.AWARD_SCREEN
+                self.state.done = True
+            elif key == pg.K_t:
+                if self.turbo_rate in c.TURBO_RATES:
+                    index = (c.TURBO_RATES.index(self.turbo_rate) + 1) % len(c.TURBO_RATES)
+                else:
+                    index = 0
+                self.setTurboRate(c.TURBO_RATES[index])
+        if click is not None:
+            # self.mouse_click[0]表示左键，self.mouse_click[1]表示右键
+            self.mouse_pos, self.mouse_click[0], self.mouse_click[1] = click
 
     # 状态转移
     def flip_state(self):  
         if self.state.next == c.EXIT:  
             pg.quit()  
             os._exit(0)  
-        self.state_name = self.state.next  
         persist = self.state.cleanup()  
+        self.state_name = self.routeState(self.state.next, persist)
         self.state = self.state_dict[self.state_name]  
         # 传递数据库连接  
         if hasattr(self.state, 'db'):  
             self.state.db = self.db  
+        sound.warmup(self.state.getWarmupSounds(persist))
         self.state.startup(self.current_time, persist)
+        # 部分界面启动时会重设窗口标题
+        if self.turbo_rate != 1:
+            self.setTurboRate(self.turbo_rate)
+
+    # 目标状态所需的图片尚未全部导入时，先进入加载界面，加载完成后再由加载界面转到目标状态
+    # 录制与回放输入时不经过加载界面，否则加载耗时不同会使两者的帧序列错位
+    def routeState(self, state_name:str, persist:dict) -> str:
+        if ((state_name == c.LOAD_SCREEN) or (c.LOAD_SCREEN not in self.state_dict)
+        or (self.recorder is not None) or (self.replayer is not None)):
+            return state_name
+        names = [name for name in self.state_dict[state_name].getPreloadGfx(persist)
+                 if not GFX.isLoaded(name)]
+        if not names:
+            return state_name
+        self.state_dict[c.LOAD_SCREEN].setTarget(state_name, names)
+        return c.LOAD_SCREEN
+
+# 脏矩形渲染：代替屏幕作为绘制目标，记录一帧内所有绘制过的区域
+# 下一帧只需在这些区域恢复背景，显示也只更新上一帧与本帧绘制过的区域
+class DirtyRectSurface():
+    def __init__(self, surface:pg.Surface):
+        self.surface = surface
+        self.rects = []         # 本帧绘制过的区域
+        self.last_rects = []    # 上一帧绘制过的区域
+        self.full = True        # 第一帧需要更新整个窗口
+
+    def blit(self, source:pg.Surface, dest, area=None, special_flags:int=0) -> pg.Rect:
+        rect = self.surface.blit(source, dest, area, special_flags)
+        self.rects.append(rect)
+        return rect
+
+    # pg.sprite.Group.draw使用blits批量绘制
+    def blits(self, blit_sequence, doreturn:int=1) -> list[pg.Rect]:
+        rects = self.surface.blits(blit_sequence)
+        self.rects.extend(rects)
+        return rects
+
+    def fill(self, color, rect=None, special_flags:int=0) -> pg.Rect:
+        rect = self.surface.fill(color, rect, special_flags)
+        self.rects.append(rect)
+        return rect
+
+    def __getattr__(self, name):
+        return getattr(self.surface, name)
+
+    # 开始绘制新的一帧，返回需要恢复背景的区域
+    def beginFrame(self) -> list[pg.Rect]:
+        self.full = False
+        self.last_rects = self.rects
+        self.rects = []
+        return self.last_rects
+
+    def getDirtyRects(self) -> list[pg.Rect] | None:
+        if self.full:
+            return None
+        return self.last_rects + self.rects
+
+# 本帧的鼠标位置，由状态机每帧设置，回放输入时为记录中的位置
+# 不经过状态机运行(例如无窗口模式)时为None，此时直接读取鼠标
+cursor_pos = None
+
+def set_cursor_pos(pos:tuple[int, int]):
+    global cursor_pos
+    cursor_pos = pos
+
+def get_mouse_pos() -> tuple[int, int]:
+    if cursor_pos is None:
+        return pg.mouse.get_pos()
+    return cursor_pos
 
 # 范围判断函数，用于判断点击
 def inArea(rect:pg.Rect, x:int, y:int):
@@ -357,6 +575,89 @@ def inArea(rect:pg.Rect, x:int, y:int):
     else:
         return False
 
+# 字体缓存，同一字体文件、字号与粗细只解析一次
+FONTS = {}
+
+def get_font(size:int, bold:bool=False, path:str=c.FONT_PATH) -> pg.font.Font:
+    key = (path, size, bold)
+    font = FONTS.get(key)
+    if font is None:
+        font = FONTS[key] = pg.font.Font(path, size)
+        font.bold = bold
+    return font
+
+# 渲染后文字的缓存，按最近使用顺序保留，每帧刷新的文字内容不变时直接复用
+# 返回的图片为共享对象，使用者不应修改
+TEXT_CACHE = OrderedDict()
+
+def render_text(text:str, size:int, color:tuple[int], background:tuple[int]=None,
+                bold:bool=False, path:str=c.FONT_PATH) -> pg.Surface:
+    key = (text, path, size, bold, color, background)
+    image = TEXT_CACHE.get(key)
+    if image is None:
+        image = TEXT_CACHE[key] = get_font(size, bold, path).render(text, True, color, background)
+        if len(TEXT_CACHE) > c.TEXT_CACHE_SIZE:
+            TEXT_CACHE.popitem(last=False)
+    else:
+        TEXT_CACHE.move_to_end(key)
+    return image
+
+# 碰撞检测用的mask缓存，以图片对象本身为键，图片被释放后对应的mask随之释放
+# 共享帧的mask只需计算一次，之后每帧切换图片时只是一次字典查找
+MASKS = weakref.WeakKeyDictionary()
+
+def get_mask(image:pg.Surface) -> pg.mask.Mask:
+    mask = MASKS.get(image)
+    if mask is None:
+        mask = MASKS[image] = pg.mask.from_surface(image)
+    return mask
+
+# 水平翻转后的帧(被魅惑的僵尸使用)，每一帧只在第一次用到时翻转一次，由同类僵尸共享
+FLIPPED = weakref.WeakKeyDictionary()
+
+def get_flipped(image:pg.Surface) -> pg.Surface:
+    flipped = FLIPPED.get(image)
+    if flipped is None:
+        flipped = FLIPPED[image] = pg.transform.flip(image, True, False)
+    return flipped
+
+# 旋转后的帧(保龄球坚果使用)，旋转角度每次变化30°，每一帧最多只有12种角度
+# 以原帧为键缓存各角度的结果，所有坚果共享
+ROTATED = weakref.WeakKeyDictionary()
+
+def get_rotated(image:pg.Surface, degree:int) -> pg.Surface:
+    rotations = ROTATED.get(image)
+    if rotations is None:
+        rotations = ROTATED[image] = {}
+    rotated = rotations.get(degree)
+    if rotated is None:
+        rotated = rotations[degree] = pg.transform.rotate(image, degree)
+    return rotated
+
+# 帧在多个实例间共享，显示效果不能通过修改帧本身的透明度实现
+# 每帧按需生成各透明度的副本并缓存，精灵直接选用对应效果的图片
+VARIANTS = weakref.WeakKeyDictionary()      # 原帧 -> {透明度: 副本}
+# 副本 -> 原帧的弱引用，便于从已带效果的图片切换到其他效果
+# 必须是弱引用：副本由VARIANTS中的原帧持有，若这里强引用原帧，两者互相保持存活，原帧永远不会释放
+VARIANT_BASE = weakref.WeakKeyDictionary()
+
+def get_effect_image(image:pg.Surface, effect:str) -> pg.Surface:
+    base_ref = VARIANT_BASE.get(image)
+    if (base_ref is not None) and (base_ref() is not None):
+        image = base_ref()
+    alpha = c.EFFECT_ALPHA[effect]
+    if alpha == 255:
+        return image
+    variants = VARIANTS.get(image)
+    if variants is None:
+        variants = VARIANTS[image] = {}
+    variant = variants.get(alpha)
+    if variant is None:
+        variant = variants[alpha] = image.copy()
+        variant.set_alpha(alpha)
+        VARIANT_BASE[variant] = weakref.ref(image)
+    return variant
+
 # 参数含义：原始图片，裁剪的x区域，裁剪的y区域，宽度，高度，颜色，缩放。
 def get_image(  sheet:pg.Surface, x:int, y:int, width:int, height:int,
                 colorkey:tuple[int]=c.BLACK, scale:int=1) -> pg.Surface:
@@ -385,66 +686,519 @@ def get_image_alpha(sheet:pg.Surface, x:int, y:int, width:int, height:int,
                                 int(rect.height*scale)))
     return image  
         
-def load_image_frames(  directory:str, image_name:str,
-                        colorkey:tuple[int], accept:tuple[str]) -> list[pg.Surface]:
-    frame_list = []
+# 解码后图片的磁盘缓存
+# 缓存文件名只由源文件相对于资源根目录的路径决定，每个源文件只对应一个缓存文件
+# 源文件的修改时间、大小与缓存版本记录在文件头中，资源变化后重新生成的缓存直接覆盖旧文件
+# 文件内容为文件头+原始RGB/RGBA像素，读取时内存映射后用pg.image.frombuffer重建，不经过图片解码器
+GFX_CACHE_MAGIC = b"PVZG"
+GFX_CACHE_HEADER = struct.Struct("<4sIqQIII")   # 标识, 版本, 源文件修改时间, 源文件大小, 宽, 高, 通道数
+gfx_cache_enabled = True    # 缓存目录不可写时关闭，避免每张图片都报错
+
+def gfx_cache_path(path:str) -> str:
+    key = os.path.relpath(path, c.PATH_RESOURCE_DIR).replace(os.sep, "/")
+    return os.path.join(c.GFX_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".raw")
+
+# 检查缓存文件头是否与源文件的(修改时间, 大小)一致，有效时返回(宽, 高, 通道数)，否则返回None
+def check_gfx_cache(data, stat:tuple[int, int]) -> tuple[int, int, int] | None:
+    if len(data) < GFX_CACHE_HEADER.size:
+        return None
+    magic, version, mtime_ns, size, width, height, channels = GFX_CACHE_HEADER.unpack_from(data)
+    if ((magic != GFX_CACHE_MAGIC) or (version != c.GFX_CACHE_VERSION) or ((mtime_ns, size) != stat)
+    or (channels not in (3, 4)) or (len(data) != GFX_CACHE_HEADER.size + width*height*channels)):
+        return None
+    return width, height, channels
+
+# 判断源文件的缓存是否有效，内存映射后只检查文件头，不读取像素
+def gfx_cache_valid(path:str) -> bool:
+    try:
+        stat = pack.resource_stat(path)
+        with open(gfx_cache_path(path), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return check_gfx_cache(mm, stat) is not None
+    except (OSError, ValueError):
+        return False
+
+# 读取源文件的缓存并转换为显示格式，缓存不存在、损坏或已过期时返回None
+def read_gfx_cache(path:str, colorkey:tuple[int]) -> pg.Surface | None:
+    try:
+        stat = pack.resource_stat(path)
+        with open(gfx_cache_path(path), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = check_gfx_cache(mm, stat)
+            if size is None:
+                return None
+            pixels = memoryview(mm)[GFX_CACHE_HEADER.size:]
+            try:
+                # 转换后得到独立的像素数据，之后才能解除内存映射
+                img = surface_from_pixels((*size, pixels), colorkey)
+            finally:
+                pixels.release()
+            return img
+    except (OSError, ValueError):
+        return None
+
+# 写入原始像素，先写临时文件再替换，避免中断时留下不完整的缓存
+def write_gfx_cache(cache_path:str, stat:tuple[int, int], raw:tuple[int, int, int, bytes]):
+    global gfx_cache_enabled
+    if not gfx_cache_enabled:
+        return
+    width, height, channels, pixels = raw
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(GFX_CACHE_HEADER.pack(GFX_CACHE_MAGIC, c.GFX_CACHE_VERSION, *stat, width, height, channels))
+            f.write(pixels)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        gfx_cache_enabled = False
+        logger.warning(f"无法写入图片缓存，本次运行不再使用缓存: {e}")
+
+# 把图片解码为原始像素(宽, 高, 通道数, 像素数据)
+# 不涉及显示格式，因此可以在工作线程中执行
+def decode_image(path:str, use_cache:bool=True) -> tuple[int, int, int, bytes]:
+    cache_path = gfx_cache_path(path) if gfx_cache_enabled else None
+    stat = pack.resource_stat(path)
+    if use_cache and cache_path:
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            size = check_gfx_cache(data, stat)
+            if size is not None:
+                return (*size, memoryview(data)[GFX_CACHE_HEADER.size:])
+        except OSError:
+            pass
+    img = pack.load_surface(path)
+    channels = 4 if img.get_alpha() else 3
+    raw = (img.get_width(), img.get_height(), channels, pg.image.tobytes(img, "RGBA" if channels == 4 else "RGB"))
+    if cache_path:
+        write_gfx_cache(cache_path, stat, raw)
+    return raw
+
+# 带alpha通道的图片保留alpha，否则用colorkey消除底色
+def convert_image(img:pg.Surface, colorkey:tuple[int]) -> pg.Surface:
+    if img.get_alpha():
+        img = img.convert_alpha()
+    else:
+        img = img.convert()
+        img.set_colorkey(colorkey)
+    return img
+
+# 由原始像素生成显示格式的图片，必须在主线程中执行
+def surface_from_pixels(raw:tuple[int, int, int, bytes], colorkey:tuple[int]) -> pg.Surface:
+    width, height, channels, pixels = raw
+    img = pg.image.frombuffer(pixels, (width, height), "RGBA" if channels == 4 else "RGB")
+    return convert_image(img, colorkey)
+
+# 单张图片导入：优先内存映射读取磁盘缓存，未命中时解码并写入缓存
+def load_image(path:str, colorkey:tuple[int]) -> pg.Surface:
+    if gfx_cache_enabled:
+        img = read_gfx_cache(path, colorkey)
+        if img is not None:
+            return img
+    return surface_from_pixels(decode_image(path, use_cache=False), colorkey)
+
+# 按编号顺序列出帧序列的全部文件
+def list_image_frames(directory:str, image_name:str, accept:tuple[str]) -> list[str]:
     tmp = {}
     # image_name is "Peashooter", pic name is "Peashooter_1", get the index 1
     index_start = len(image_name) + 1 
-    frame_num = 0
-    for pic in os.listdir(directory):
+    for pic in pack.listdir(directory):
         name, ext = os.path.splitext(pic)
         if ext.lower() in accept:
             index = int(name[index_start:])
-            img = pg.image.load(os.path.join(directory, pic))
-            if img.get_alpha():
-                img = img.convert_alpha()
-            else:
-                img = img.convert()
-                img.set_colorkey(colorkey)
-            tmp[index]= img
-            frame_num += 1
+            tmp[index] = os.path.join(directory, pic)
 
-    for i in range(frame_num):  # 这里注意编号必须连续，否则会出错
-        frame_list.append(tmp[i])
-    return frame_list
+    # 这里注意编号必须连续，否则会出错
+    return [tmp[i] for i in range(len(tmp))]
 
-# colorkeys 是设置图像中的某个颜色值为透明,这里用来消除白边
-def load_all_gfx(   directory:str, colorkey:tuple[int]=c.WHITE,
-                    accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp")) -> dict[str:pg.Surface]:
-    graphics = {}
-    for name1 in os.listdir(directory):
+def load_image_frames(  directory:str, image_name:str,
+                        colorkey:tuple[int], accept:tuple[str]) -> list[pg.Surface]:
+    return [load_image(path, colorkey) for path in list_image_frames(directory, image_name, accept)]
+
+# 建立图片名称到文件路径的索引，只遍历目录而不解码图片
+# 值为(路径, 是否为帧序列)：帧序列对应其所在文件夹，单张图片对应图片文件本身
+def index_all_gfx(  directory:str,
+                    accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp")) -> dict[str, tuple[str, bool]]:
+    index = {}
+    for name1 in pack.listdir(directory):
         # subfolders under the folder resources\graphics
         dir1 = os.path.join(directory, name1)
-        if os.path.isdir(dir1):
-            for name2 in os.listdir(dir1):
+        if pack.isdir(dir1):
+            for name2 in pack.listdir(dir1):
                 dir2 = os.path.join(dir1, name2)
-                if os.path.isdir(dir2):
+                if pack.isdir(dir2):
                 # e.g. subfolders under the folder resources\graphics\Zombies
-                    for name3 in os.listdir(dir2):
+                    for name3 in pack.listdir(dir2):
                         dir3 = os.path.join(dir2, name3)
                         # e.g. subfolders or pics under the folder resources\graphics\Zombies\ConeheadZombie
-                        if os.path.isdir(dir3):
+                        if pack.isdir(dir3):
                             # e.g. it"s the folder resources\graphics\Zombies\ConeheadZombie\ConeheadZombieAttack
                             image_name, _ = os.path.splitext(name3)
-                            graphics[image_name] = load_image_frames(dir3, image_name, colorkey, accept)
+                            index[image_name] = (dir3, True)
                         else:
                             # e.g. pics under the folder resources\graphics\Plants\Peashooter
                             image_name, _ = os.path.splitext(name2)
-                            graphics[image_name] = load_image_frames(dir2, image_name, colorkey, accept)
+                            index[image_name] = (dir2, True)
                             break
                 else:
                 # e.g. pics under the folder resources\graphics\Screen
                     name, ext = os.path.splitext(name2)
                     if ext.lower() in accept:
-                        img = pg.image.load(dir2)
-                        if img.get_alpha():
-                            img = img.convert_alpha()
-                        else:
-                            img = img.convert()
-                            img.set_colorkey(colorkey)
-                        graphics[name] = img
+                        index[name] = (dir2, False)
+    return index
+
+# 按索引项列出需要解码的全部文件
+def list_gfx_entry(name:str, path:str, is_frames:bool, accept:tuple[str]) -> list[str]:
+    if is_frames:
+        return list_image_frames(path, name, accept)
+    return [path]
+
+# 按索引项导入图片：帧序列返回图片列表，单张图片返回图片本身
+def load_gfx_entry( name:str, path:str, is_frames:bool,
+                    colorkey:tuple[int], accept:tuple[str]) -> pg.Surface | list[pg.Surface]:
+    if is_frames:
+        return load_image_frames(path, name, colorkey, accept)
+    return load_image(path, colorkey)
+
+# 批量导入索引中的图片
+# workers大于1时由线程池并行解码为原始像素，主线程只负责按提交顺序转换显示格式
+def load_gfx_entries(   entries:dict[str, tuple[str, bool]], colorkey:tuple[int],
+                        accept:tuple[str], workers:int=c.GFX_LOAD_WORKERS) -> dict[str:pg.Surface]:
+    graphics = {}
+    if workers <= 1:
+        for name, (path, is_frames) in entries.items():
+            graphics[name] = load_gfx_entry(name, path, is_frames, colorkey, accept)
+        return graphics
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for name, (path, is_frames) in entries.items():
+            pending[name] = [pool.submit(decode_image, file) for file in list_gfx_entry(name, path, is_frames, accept)]
+        for name, futures in pending.items():
+            frames = [surface_from_pixels(future.result(), colorkey) for future in futures]
+            graphics[name] = frames if entries[name][1] else frames[0]
     return graphics
 
-SCREEN = pg.display.set_mode(c.SCREEN_SIZE) # 设置初始屏幕
-GFX = load_all_gfx(c.PATH_IMG_DIR)
+# colorkeys 是设置图像中的某个颜色值为透明,这里用来消除白边
+def load_all_gfx(   directory:str, colorkey:tuple[int]=c.WHITE,
+                    accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp"),
+                    workers:int=c.GFX_LOAD_WORKERS) -> dict[str:pg.Surface]:
+    return load_gfx_entries(index_all_gfx(directory, accept), colorkey, accept, workers)
+
+# 预先生成全部图片与图集大图的缓存，并清理不再对应任何资源的旧缓存文件
+# 返回(新生成数量, 清理数量)
+def build_gfx_cache(directory:str=c.PATH_IMG_DIR,
+                    accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp"),
+                    workers:int=c.GFX_LOAD_WORKERS,
+                    atlas_dir:str=c.PATH_ATLAS_DIR) -> tuple[int, int]:
+    files = []
+    for name, (path, is_frames) in index_all_gfx(directory, accept).items():
+        files.extend(list_gfx_entry(name, path, is_frames, accept))
+    # 图集大图同样经由缓存导入，不能当作旧缓存清理
+    sheet_names = {frame[0] for entry in load_atlas_index(atlas_dir).values() for frame in entry["frames"]}
+    files.extend(os.path.join(atlas_dir, sheet_name) for sheet_name in sorted(sheet_names))
+
+    valid = set()
+    missing = []
+    for file in files:
+        valid.add(os.path.basename(gfx_cache_path(file)))
+        if not gfx_cache_valid(file):
+            missing.append(file)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for _ in pool.map(decode_image, missing):
+            pass
+
+    removed = 0
+    if os.path.isdir(c.GFX_CACHE_DIR):
+        for cache_name in os.listdir(c.GFX_CACHE_DIR):
+            if cache_name not in valid:
+                os.remove(os.path.join(c.GFX_CACHE_DIR, cache_name))
+                removed += 1
+    return len(missing), removed
+
+# 图集：把同一实体的全部动画帧打包进少数几张大图，并用json索引记录每帧位置
+# 运行时只需解码图集大图，各帧都是图集的subsurface视图，减少文件读取与内存分配次数
+# 只打包全部带alpha通道的帧序列，依赖colorkey的图片仍按单个文件导入
+ATLAS_INDEX_NAME = "atlas.json"
+
+# 帧序列源文件的签名，源文件变化后对应的图集条目失效
+def gfx_files_signature(files:list[str]) -> str:
+    key = []
+    for file in files:
+        mtime_ns, size = pack.resource_stat(file)
+        key.append(f"{os.path.basename(file)}|{mtime_ns}|{size}")
+    return hashlib.sha1("\n".join(key).encode("utf-8")).hexdigest()
+
+# 按行(shelf)依次摆放各帧，返回每帧的(图集编号, x, y)与各图集的尺寸
+def pack_atlas_frames(sizes:list[tuple[int, int]], max_size:int) -> tuple[list[tuple[int, int, int]], list[list[int]]]:
+    places = [None] * len(sizes)
+    sheets = []     # 每张图集为[宽, 高]
+    shelf_x = shelf_y = shelf_height = 0
+    # 按高度从大到小摆放，减少每行的空白
+    for i in sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True):
+        width, height = sizes[i]
+        if sheets and (shelf_x + width > max_size):
+            shelf_x = 0
+            shelf_y += shelf_height
+            shelf_height = 0
+        # 超过单张图集的大小时换新图集，超出最大尺寸的单帧独占一行
+        if (not sheets) or (shelf_y > 0 and shelf_y + height > max_size):
+            sheets.append([0, 0])
+            shelf_x = shelf_y = shelf_height = 0
+        places[i] = (len(sheets) - 1, shelf_x, shelf_y)
+        shelf_x += width
+        shelf_height = max(shelf_height, height)
+        sheets[-1][0] = max(sheets[-1][0], shelf_x)
+        sheets[-1][1] = max(sheets[-1][1], shelf_y + height)
+    return places, sheets
+
+# 生成全部图集及其索引，返回生成的图集数量
+def build_atlas(directory:str=c.PATH_IMG_DIR, atlas_dir:str=c.PATH_ATLAS_DIR,
+                accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp"),
+                max_size:int=c.ATLAS_MAX_SIZE) -> int:
+    # 按实体分组，e.g. Zombies/ConeheadZombie下的全部动画为一组
+    groups = {}
+    for name, (path, is_frames) in index_all_gfx(directory, accept).items():
+        if is_frames:
+            entity = os.path.join(*os.path.relpath(path, directory).split(os.sep)[:2])
+            groups.setdefault(entity, []).append((name, path))
+
+    os.makedirs(atlas_dir, exist_ok=True)
+    for old in os.listdir(atlas_dir):
+        os.remove(os.path.join(atlas_dir, old))
+
+    entries = {}
+    sheet_num = 0
+    for entity, names in sorted(groups.items()):
+        frames = []     # (名称, 图片)
+        signatures = {}
+        for name, path in names:
+            files = list_image_frames(path, name, accept)
+            images = [pack.load_surface(file) for file in files]
+            if not all(img.get_alpha() for img in images):
+                continue
+            signatures[name] = gfx_files_signature(files)
+            frames.extend((name, img) for img in images)
+        if not frames:
+            continue
+
+        places, sizes = pack_atlas_frames([img.get_size() for _, img in frames], max_size)
+        sheet_names = []
+        for i, size in enumerate(sizes):
+            sheet = pg.Surface(size, pg.SRCALPHA, 32)
+            sheet.fill((0, 0, 0, 0))
+            for (_, img), (sheet_index, x, y) in zip(frames, places):
+                # 目标区域全透明，取最大值即原样复制像素(包括alpha)
+                if sheet_index == i:
+                    sheet.blit(img, (x, y), special_flags=pg.BLEND_RGBA_MAX)
+            sheet_name = f"{entity.replace(os.sep, '_')}_{i}.png"
+            pg.image.save(sheet, os.path.join(atlas_dir, sheet_name))
+            sheet_names.append(sheet_name)
+        sheet_num += len(sizes)
+
+        for name in signatures:
+            entries[name] = {"signature": signatures[name], "frames": []}
+        for (name, img), (sheet_index, x, y) in zip(frames, places):
+            entries[name]["frames"].append([sheet_names[sheet_index], x, y, img.get_width(), img.get_height()])
+
+    with open(os.path.join(atlas_dir, ATLAS_INDEX_NAME), "w", encoding="utf-8") as f:
+        json.dump({"version": c.ATLAS_VERSION, "entries": entries}, f)
+    return sheet_num
+
+# 读取图集索引，不存在或版本不符时返回空索引
+def load_atlas_index(atlas_dir:str) -> dict:
+    try:
+        atlas = json.loads(pack.read_bytes(os.path.join(atlas_dir, ATLAS_INDEX_NAME)))
+    except (OSError, ValueError):
+        return {}
+    if atlas.get("version") != c.ATLAS_VERSION:
+        logger.warning("图集版本与游戏不符，已忽略图集")
+        return {}
+    return atlas["entries"]
+
+# 按需加载的图片资源表，接口与load_all_gfx返回的字典相同
+# 启动时只建立名称到路径的索引，某个名称第一次被访问时才解码对应的图片
+class GFXRegistry(Mapping):
+    def __init__(   self, directory:str, colorkey:tuple[int]=c.WHITE,
+                    accept:tuple[str]=(".png", ".jpg", ".bmp", ".gif", ".webp"),
+                    atlas_dir:str=c.PATH_ATLAS_DIR):
+        self.colorkey = colorkey
+        self.accept = accept
+        self.index = index_all_gfx(directory, accept)
+        self.loaded = {}
+        # 按实体文件夹分组，e.g. Zombies/NormalZombie下的全部名称为一组
+        self.entities = {}
+        self.entity_of = {}
+        for name, (path, _) in self.index.items():
+            entity = tuple(os.path.relpath(path, directory).split(os.sep)[:2])
+            self.entities.setdefault(entity, []).append(name)
+            self.entity_of[name] = entity
+        self.atlas_dir = atlas_dir
+        self.atlas = load_atlas_index(atlas_dir)
+        self.sheets = {}    # 已解码的图集大图
+        # 所有精灵共享的裁剪帧：(名称, x, y, 宽, 高, colorkey, 缩放) -> 帧元组
+        self.crops = {}
+
+    def __getitem__(self, name:str) -> pg.Surface | list[pg.Surface]:
+        if name in self.loaded:
+            return self.loaded[name]
+        path, is_frames = self.index[name]
+        gfx = self.loadFromAtlas(name, path)
+        if gfx is None:
+            gfx = load_gfx_entry(name, path, is_frames, self.colorkey, self.accept)
+        self.loaded[name] = gfx
+        return gfx
+
+    def __contains__(self, name) -> bool:
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # 是否已经解码
+    def isLoaded(self, name:str) -> bool:
+        return name in self.loaded
+
+    # 与name位于同一实体文件夹下的全部名称，不存在时为空
+    def entityNames(self, name:str) -> list[str]:
+        if name not in self.entity_of:
+            return []
+        return self.entities[self.entity_of[name]]
+
+    # 某一类别文件夹(e.g. Bullets)下的全部名称
+    def categoryNames(self, category:str) -> list[str]:
+        return [name for name, entity in self.entity_of.items() if entity[0] == category]
+
+    # 释放已解码的图片，已经取出图片的精灵不受影响，再次访问时重新导入
+    def evict(self, names):
+        names = set(names)
+        for name in names:
+            self.loaded.pop(name, None)
+        for key in [key for key in self.crops if key[0] in names]:
+            del self.crops[key]
+        # 不再被任何已导入条目引用的图集大图一并释放
+        used = {frame[0] for name in self.loaded if name in self.atlas
+                for frame in self.atlas[name]["frames"]}
+        for sheet_name in tuple(self.sheets):
+            if sheet_name not in used:
+                del self.sheets[sheet_name]
+
+    # 裁剪并缩放name的全部帧，结果按参数缓存并由所有实例共享，共享的帧不应被修改
+    def getFrames(  self, name:str, x:int, y:int, width:int, height:int,
+                    colorkey:tuple[int]=c.BLACK, scale:int=1) -> tuple[pg.Surface]:
+        key = (name, x, y, width, height, colorkey, scale)
+        frames = self.crops.get(key)
+        if frames is None:
+            frames = self.crops[key] = tuple(get_image(frame, x, y, width, height, colorkey, scale)
+                                             for frame in self[name])
+            # 同时为每一帧算好mask
+            for frame in frames:
+                get_mask(frame)
+        return frames
+
+    # 图集中name对应的条目，图集中没有该名称或源文件已变化时返回None
+    def atlasEntry(self, name:str, path:str) -> dict | None:
+        entry = self.atlas.get(name)
+        if entry is None:
+            return None
+        if gfx_files_signature(list_image_frames(path, name, self.accept)) != entry["signature"]:
+            return None
+        return entry
+
+    # 从图集中取出帧序列，无法使用图集时返回None
+    def loadFromAtlas(self, name:str, path:str) -> list[pg.Surface] | None:
+        entry = self.atlasEntry(name, path)
+        if entry is None:
+            return None
+        frames = []
+        try:
+            for sheet_name, x, y, width, height in entry["frames"]:
+                if sheet_name not in self.sheets:
+                    self.sheets[sheet_name] = load_image(os.path.join(self.atlas_dir, sheet_name), self.colorkey)
+                frames.append(self.sheets[sheet_name].subsurface((x, y, width, height)))
+        except (OSError, ValueError, pg.error) as e:
+            logger.warning(f"图集读取失败，改为逐个文件导入{name}: {e}")
+            return None
+        return frames
+
+    # 并行解码尚未导入的图片，names为None时导入全部
+    def preload(self, names=None, workers:int=c.GFX_LOAD_WORKERS):
+        if names is None:
+            names = self.index
+        entries = {}
+        for name in names:
+            if name in self.loaded:
+                continue
+            gfx = self.loadFromAtlas(name, self.index[name][0])
+            if gfx is None:
+                entries[name] = self.index[name]
+            else:
+                self.loaded[name] = gfx
+        self.loaded.update(load_gfx_entries(entries, self.colorkey, self.accept, workers))
+
+# 后台导入图片：工作线程把图片解码为原始像素，主线程每次调用pump时在限定时间内完成显示格式转换
+# 按提交顺序逐个完成，用于加载界面一边显示进度一边导入
+class GFXLoader():
+    def __init__(self, registry:GFXRegistry, names, workers:int=c.GFX_LOAD_WORKERS):
+        self.registry = registry
+        self.jobs = []  # (名称, 是否为帧序列, 需要解码的图集大图, 各帧的解码任务)
+        self.pool = pool = ThreadPoolExecutor(max_workers=max(workers, 1))
+        sheet_jobs = {}
+        for name in names:
+            if registry.isLoaded(name):
+                continue
+            path, is_frames = registry.index[name]
+            entry = registry.atlasEntry(name, path)
+            if entry is not None:
+                sheets = {}
+                for sheet_name, *_ in entry["frames"]:
+                    if sheet_name in registry.sheets:
+                        continue
+                    if sheet_name not in sheet_jobs:
+                        sheet_jobs[sheet_name] = pool.submit(decode_image, os.path.join(registry.atlas_dir, sheet_name))
+                    sheets[sheet_name] = sheet_jobs[sheet_name]
+                self.jobs.append((name, is_frames, sheets, None))
+            else:
+                files = list_gfx_entry(name, path, is_frames, registry.accept)
+                self.jobs.append((name, is_frames, None, [pool.submit(decode_image, file) for file in files]))
+        # 已提交的任务会继续执行，全部完成后线程自动退出
+        pool.shutdown(wait=False)
+        self.total = len(self.jobs)
+
+    # 取消尚未开始的解码，离开加载界面或退出游戏时不必等待它们完成
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # 完成已解码图片的转换，超过time_limit毫秒后留到下次调用，全部完成时返回True
+    def pump(self, time_limit:float) -> bool:
+        start = time.perf_counter()
+        while self.jobs:
+            name, is_frames, sheets, futures = self.jobs[0]
+            if not all(future.done() for future in (futures if sheets is None else sheets.values())):
+                break
+            if sheets is None:
+                frames = [surface_from_pixels(future.result(), self.registry.colorkey) for future in futures]
+                self.registry.loaded[name] = frames if is_frames else frames[0]
+            else:
+                for sheet_name, future in sheets.items():
+                    if sheet_name not in self.registry.sheets:
+                        self.registry.sheets[sheet_name] = surface_from_pixels(future.result(), self.registry.colorkey)
+                self.registry[name]
+            self.jobs.pop(0)
+            if (time.perf_counter() - start) * 1000 >= time_limit:
+                break
+        return not self.jobs
+
+    # 0~1之间的加载进度
+    @property
+    def progress(self) -> float:
+        if self.total == 0:
+            return 1
+        return 1 - len(self.jobs) / self.total
+
+# 屏幕与图片资源表，由bootstrap.bootstrap()在游戏启动时创建
+SCREEN = None
+GFX = None
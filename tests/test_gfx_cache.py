@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pygame as pg
+from source import constants as c
+from source import tool
+
+class GFXCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.old_dirs = (c.PATH_RESOURCE_DIR, c.GFX_CACHE_DIR)
+        c.PATH_RESOURCE_DIR = os.path.join(self.tmp, "resources")
+        c.GFX_CACHE_DIR = os.path.join(self.tmp, "gfxcache")
+        os.makedirs(os.path.join(c.PATH_RESOURCE_DIR, "graphics"))
+        self.path = os.path.join(c.PATH_RESOURCE_DIR, "graphics", "Sun.png")
+        img = pg.Surface((4, 3))
+        img.fill((255, 0, 0))
+        pg.image.save(img, self.path)
+
+    def tearDown(self):
+        c.PATH_RESOURCE_DIR, c.GFX_CACHE_DIR = self.old_dirs
+        shutil.rmtree(self.tmp)
+
+    def test_cache_name_only_depends_on_relative_path(self):
+        moved = os.path.join(self.tmp, "moved")
+        shutil.copytree(c.PATH_RESOURCE_DIR, moved)
+        name = os.path.basename(tool.gfx_cache_path(self.path))
+        c.PATH_RESOURCE_DIR = moved
+        self.assertEqual(os.path.basename(tool.gfx_cache_path(os.path.join(moved, "graphics", "Sun.png"))), name)
+
+    def test_changed_resource_replaces_cache_file(self):
+        tool.decode_image(self.path)
+        cache_files = os.listdir(c.GFX_CACHE_DIR)
+        self.assertEqual(len(cache_files), 1)
+        self.assertTrue(tool.gfx_cache_valid(self.path))
+
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertFalse(tool.gfx_cache_valid(self.path))
+
+        width, height, _, _ = tool.decode_image(self.path)
+        self.assertEqual((width, height), (4, 3))
+        self.assertEqual(os.listdir(c.GFX_CACHE_DIR), cache_files)
+        self.assertTrue(tool.gfx_cache_valid(self.path))
+
+if __name__ == "__main__":
+    unittest.main()